@@ -0,0 +1,133 @@
+import json
+import os
+import platform
+import time
+import warnings
+from typing import Dict, Optional
+
+import pygame
+
+# 已知的中文字体位置，按优先级排列；都找不到时再用 pygame 的系统字体查询（较慢，需要 fc-list 等）
+FONT_CANDIDATES = {
+    "Windows": [
+        "C:/Windows/Fonts/msyh.ttc",  # 微软雅黑
+        "C:/Windows/Fonts/simhei.ttf",  # 黑体
+        "C:/Windows/Fonts/simsun.ttc",  # 宋体
+    ],
+    "Darwin": [
+        "/System/Library/Fonts/PingFang.ttc",  # 苹方
+        "/System/Library/Fonts/STHeiti Light.ttc",  # 黑体
+        "/System/Library/Fonts/Hiragino Sans GB.ttc",  # 冬青黑体
+    ],
+    "Linux": [
+        "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",  # 文泉驿微米黑
+        "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",  # 文泉驿正黑
+        "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+        "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    ],
+}
+SYSTEM_FONT_NAMES = ["microsoftyahei", "pingfang", "wenquanyimicrohei", "notosanscjksc", "simhei"]
+# 没有中文字体时的后备（只能显示英文）
+FALLBACK_FONTS = {
+    "Windows": ["C:/Windows/Fonts/arial.ttf"],
+    "Darwin": ["/System/Library/Fonts/Arial.ttf"],
+    "Linux": [
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+        "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+    ],
+}
+
+FONT_CACHE_PATH = os.environ.get("SNAKE_FONT_CACHE", "font_cache.json")
+NEGATIVE_CACHE_TTL = 24 * 3600  # 没找到字体的结果缓存一天，期间安装了字体也会在一天内被发现
+
+_font_path: Optional[str] = None
+_font_path_resolved = False
+_fonts: Dict[int, pygame.font.Font] = {}
+
+
+def init_pygame():
+    """只初始化客户端用到的显示和字体模块，不初始化音频、手柄等（pygame.init() 会全部初始化）"""
+    if not pygame.display.get_init():
+        pygame.display.init()
+    if not pygame.font.get_init():
+        pygame.font.init()
+
+
+def probe_font_path() -> Optional[str]:
+    """按候选列表查找字体文件，返回路径；找不到时返回 None（使用 pygame 默认字体）"""
+    system = platform.system()
+    for path in FONT_CANDIDATES.get(system, FONT_CANDIDATES["Linux"]):
+        if os.path.exists(path):
+            return path
+    with warnings.catch_warnings():
+        # 没有 fc-list 的系统上 pygame 会发出警告，这里只是查询不到而已
+        warnings.simplefilter("ignore")
+        path = pygame.font.match_font(SYSTEM_FONT_NAMES)
+    if path:
+        return path
+    for path in FALLBACK_FONTS.get(system, FALLBACK_FONTS["Linux"]):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def load_cached_font_path(cache_path: str):
+    """读取磁盘缓存，缓存有效时返回 (True, 路径)，否则返回 (False, None)"""
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return False, None
+    if not isinstance(cached, dict) or cached.get("system") != platform.system():
+        return False, None
+    path = cached.get("path")
+    if path:
+        return os.path.exists(path), path
+    return time.time() - cached.get("checked_at", 0) < NEGATIVE_CACHE_TTL, None
+
+
+def find_font_path(cache_path: str = FONT_CACHE_PATH) -> Optional[str]:
+    """整个进程只查找一次字体文件，结果缓存到磁盘，下次启动直接使用"""
+    global _font_path, _font_path_resolved
+    if _font_path_resolved:
+        return _font_path
+
+    valid, path = load_cached_font_path(cache_path)
+    if not valid:
+        path = probe_font_path()
+        try:
+            with open(cache_path, "w", encoding="utf-8") as f:
+                json.dump({"system": platform.system(), "path": path, "checked_at": time.time()}, f)
+        except OSError:
+            pass  # 缓存写不了只是下次启动慢一点
+
+    _font_path, _font_path_resolved = path, True
+    return path
+
+
+def get_chinese_font(size: int) -> pygame.font.Font:
+    """获取支持中文的字体，同一字号只加载一次"""
+    font = _fonts.get(size)
+    if font is None:
+        init_pygame()
+        path = find_font_path()
+        try:
+            font = pygame.font.Font(path, size)
+        except (OSError, pygame.error):
+            font = pygame.font.Font(None, size)
+        _fonts[size] = font
+    return font
+
+
+class LazyFont:
+    """第一次用到时才加载的字体，启动时不用的字号（如帧耗时面板）不产生开销"""
+
+    def __init__(self, size: int):
+        self.size_px = size
+        self._font: Optional[pygame.font.Font] = None
+
+    def __getattr__(self, name):
+        font = self._font
+        if font is None:
+            font = self._font = get_chinese_font(self.size_px)
+        return getattr(font, name)
@@ -0,0 +1,127 @@
+import json
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import pygame
+
+
+class FrameProfiler:
+    """游戏循环的分阶段计时器和叠加显示（F3 开关，F4 导出追踪文件）
+
+    循环开始时调用 begin_frame()，每个阶段结束后调用 lap("阶段名")，
+    帧结束时调用 end_frame()。关闭时 lap 只做一次判断，几乎没有开销。
+    导出的追踪文件是 Chrome trace 格式，可以用 chrome://tracing 或 Perfetto 打开。
+    """
+
+    def __init__(self, window: int = 240, trace_frames: int = 600):
+        self.enabled = False
+        self.window = window
+        self.frame_times: Deque[float] = deque(maxlen=window)
+        self.phase_times: Dict[str, Deque[float]] = {}
+        self.trace: Deque[List[Tuple[str, float, float]]] = deque(maxlen=trace_frames)
+
+        self.frame_start = 0.0
+        self.last_lap = 0.0
+        # 只有 begin_frame 之后才记录：F3 在帧中间打开时，这一帧剩下的 lap 和 end_frame 会被忽略
+        self.in_frame = False
+        self.current: List[Tuple[str, float, float]] = []
+
+        # 文字每隔一段时间才重新渲染，避免叠加层本身拖慢帧率
+        self.text_surfaces: List[pygame.Surface] = []
+        self.next_text_update = 0.0
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.in_frame = False
+        self.frame_times.clear()
+        self.phase_times.clear()
+        self.trace.clear()
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.frame_start = self.last_lap = time.perf_counter()
+        self.current = []
+        self.in_frame = True
+
+    def lap(self, phase: str):
+        """记录从上一个 lap（或帧开始）到现在的耗时，归入 phase"""
+        if not self.in_frame:
+            return
+        now = time.perf_counter()
+        self.current.append((phase, self.last_lap, now))
+        times = self.phase_times.get(phase)
+        if times is None:
+            times = self.phase_times[phase] = deque(maxlen=self.window)
+        times.append((now - self.last_lap) * 1000)
+        self.last_lap = now
+
+    def end_frame(self):
+        if not self.in_frame:
+            return
+        self.in_frame = False
+        self.frame_times.append((time.perf_counter() - self.frame_start) * 1000)
+        self.trace.append(self.current)
+
+    @staticmethod
+    def stats(values) -> Tuple[float, float]:
+        """返回 (平均值, p99)"""
+        ordered = sorted(values)
+        return sum(ordered) / len(ordered), ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+    def draw(self, surface: pygame.Surface, font: pygame.font.Font, position: Optional[Tuple[int, int]] = None):
+        """在屏幕右下角绘制各阶段的平均耗时、p99 和帧时间走势"""
+        if not self.enabled or not self.frame_times:
+            return
+
+        now = time.perf_counter()
+        if now >= self.next_text_update:
+            self.next_text_update = now + 0.25
+            average, p99 = self.stats(self.frame_times)
+            lines = [f"帧 {average:.1f} ms (p99 {p99:.1f})  {1000 / max(average, 0.001):.0f} FPS"]
+            for phase, times in self.phase_times.items():
+                average, p99 = self.stats(times)
+                lines.append(f"{phase:<12} {average:6.2f} / {p99:6.2f} ms")
+            self.text_surfaces = [font.render(line, True, (255, 255, 255)) for line in lines]
+
+        line_height = font.get_linesize()
+        width = max(240, max(text.get_width() for text in self.text_surfaces) + 20)
+        graph_height = 50
+        height = line_height * len(self.text_surfaces) + graph_height + 30
+        if position is None:
+            position = (surface.get_width() - width - 10, surface.get_height() - height - 10)
+        panel = pygame.Rect(position, (width, height))
+
+        background = pygame.Surface(panel.size, pygame.SRCALPHA)
+        background.fill((0, 0, 0, 170))
+        surface.blit(background, panel)
+        for i, text in enumerate(self.text_surfaces):
+            surface.blit(text, (panel.x + 10, panel.y + 10 + i * line_height))
+
+        # 帧时间走势：以 33ms 为满刻度，绿线为 16.7ms（60 FPS）
+        graph = pygame.Rect(panel.x + 10, panel.bottom - graph_height - 10, width - 20, graph_height)
+        scale = graph.height / 33.3
+        target_y = graph.bottom - int(16.7 * scale)
+        pygame.draw.line(surface, (76, 175, 80), (graph.x, target_y), (graph.right, target_y), 1)
+        if len(self.frame_times) > 1:
+            step = graph.width / (self.window - 1)
+            points = [(graph.x + int(i * step), graph.bottom - int(min(value, 33.3) * scale))
+                      for i, value in enumerate(self.frame_times)]
+            pygame.draw.lines(surface, (255, 193, 7), False, points, 1)
+
+    def dump(self, path: Optional[str] = None) -> str:
+        """把最近记录的帧写成 Chrome trace 文件，返回文件路径"""
+        path = path or time.strftime("frame_trace_%Y%m%d_%H%M%S.json")
+        events = []
+        for frame in self.trace:
+            if not frame:
+                continue
+            events.append({"name": "frame", "ph": "X", "pid": 0, "tid": 0,
+                           "ts": frame[0][1] * 1e6, "dur": (frame[-1][2] - frame[0][1]) * 1e6})
+            for phase, start, end in frame:
+                events.append({"name": phase, "ph": "X", "pid": 0, "tid": 1,
+                               "ts": start * 1e6, "dur": (end - start) * 1e6})
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return path
@@ -0,0 +1,110 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import List
+
+
+class HighScoreStore:
+    """单机版排行榜的持久化
+
+    - 内存中保存前 N 名（分数 + 时间戳），游戏循环只读写内存
+    - 后台线程负责写文件：提交后等待 debounce 秒，把这段时间内的多次提交合并成一次写入
+    - 先写临时文件再重命名，写到一半崩溃也不会损坏原文件
+    """
+
+    def __init__(self, path: str = "high_score.json", top_n: int = 10, debounce: float = 1.0):
+        self.path = path
+        self.top_n = top_n
+        self.debounce = debounce
+        self.entries: List[dict] = self.load()
+
+        self._lock = threading.Lock()
+        self._changed = False  # 有尚未写入文件的修改
+        self._dirty = threading.Event()
+        self._closing = threading.Event()
+        self._thread = threading.Thread(target=self._writer, name="high-score-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def best(self) -> int:
+        return self.entries[0]["score"] if self.entries else 0
+
+    def load(self) -> List[dict]:
+        """读取排行榜，兼容旧版只有一个最高分的格式"""
+        if not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"* 读取排行榜失败，将使用空排行榜: {e}")
+            return []
+
+        # 内容是合法JSON但结构不对（被手动修改或其他程序写入）时同样使用空排行榜
+        if not isinstance(data, dict) or not isinstance(data.get("scores", []), list):
+            print(f"* 读取排行榜失败，将使用空排行榜: {self.path} 格式不正确")
+            return []
+        if "scores" in data:
+            entries = [entry for entry in data["scores"]
+                       if isinstance(entry, dict) and isinstance(entry.get("score"), int)]
+        elif isinstance(data.get("high_score"), int) and data["high_score"] > 0:
+            entries = [{"score": data["high_score"], "time": None}]
+        else:
+            entries = []
+        entries.sort(key=lambda entry: entry["score"], reverse=True)
+        return entries[:self.top_n]
+
+    def submit(self, score: int) -> bool:
+        """提交一局的得分，进入前 N 名时返回 True（只修改内存，不做文件读写）"""
+        if score <= 0:
+            return False
+        if len(self.entries) >= self.top_n and score <= self.entries[-1]["score"]:
+            return False
+
+        with self._lock:
+            self.entries.append({"score": score, "time": time.time()})
+            self.entries.sort(key=lambda entry: entry["score"], reverse=True)
+            del self.entries[self.top_n:]
+            self._changed = True
+        self._dirty.set()
+        return True
+
+    def close(self):
+        """立即写入尚未保存的修改并停止后台线程"""
+        self._closing.set()
+        self._dirty.set()
+        self._thread.join()
+
+    def _writer(self):
+        while True:
+            self._dirty.wait()
+            # 防抖：等一会儿，把连续的多次提交合并成一次写入（关闭时立即写入）
+            self._closing.wait(self.debounce)
+            self._dirty.clear()
+            self._write()
+            if self._closing.is_set():
+                break
+
+    def _write(self):
+        with self._lock:
+            if not self._changed:
+                return
+            self._changed = False
+            data = {"high_score": self.best, "scores": list(self.entries)}
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd, temp_path = tempfile.mkstemp(prefix=".high_score.", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except OSError as e:
+            print(f"* 保存排行榜失败: {e}")
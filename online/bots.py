@@ -0,0 +1,188 @@
+import time
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+
+from online.spatial_index import SpatialIndex
+
+# 为避免循环导入，这里不引用服务器模块里的 Direction 枚举，只使用方向向量
+DIRECTION_VECTORS = {
+    "UP": (0, -1),
+    "DOWN": (0, 1),
+    "LEFT": (-1, 0),
+    "RIGHT": (1, 0),
+}
+OPPOSITE = {"UP": "DOWN", "DOWN": "UP", "LEFT": "RIGHT", "RIGHT": "LEFT"}
+
+UNREACHABLE = 1 << 30
+
+
+class DistanceField:
+    """到最近食物的距离场（多源BFS）
+
+    每个tick只计算一次，所有机器人共享。计算范围限定在机器人附近的区块内，
+    所以在超大地图上开销只与机器人数量有关，与地图大小无关。
+    """
+
+    def __init__(self):
+        self.dist: Dict[Tuple[int, int], int] = {}
+        self.complete = True  # 超出时间预算时为 False，此时距离场只覆盖了一部分
+
+    def compute(self, grid_width: int, grid_height: int, snake_index: SpatialIndex,
+                food_index: SpatialIndex, region: Optional[Set[Tuple[int, int]]], deadline: float):
+        """region 为允许搜索的区块集合，None 表示整张地图"""
+        chunk_size = snake_index.chunk_size
+        dist = {}
+        queue = deque()
+
+        if region is None:
+            seeds = [pos for members in food_index.chunks.values() for pos in members]
+        else:
+            seeds = [pos for chunk in region for pos in food_index.chunks.get(chunk, ())]
+        for pos in seeds:
+            dist[pos] = 0
+            queue.append(pos)
+
+        cells = snake_index.cells
+        popleft = queue.popleft
+        append = queue.append
+        visited = 0
+        self.complete = True
+        while queue:
+            visited += 1
+            # 每处理一批格子检查一次时间预算，超时就停止，保留已算出的部分
+            if visited & 1023 == 0 and time.perf_counter() > deadline:
+                self.complete = False
+                break
+
+            x, y = pos = popleft()
+            next_dist = dist[pos] + 1
+            for nx, ny in ((x, y - 1), (x, y + 1), (x - 1, y), (x + 1, y)):
+                if nx < 0 or ny < 0 or nx >= grid_width or ny >= grid_height:
+                    continue
+                neighbor = (nx, ny)
+                if neighbor in dist or neighbor in cells:
+                    continue
+                if region is not None and (nx // chunk_size, ny // chunk_size) not in region:
+                    continue
+                dist[neighbor] = next_dist
+                append(neighbor)
+
+        self.dist = dist
+
+    def get(self, pos: Tuple[int, int]) -> int:
+        return self.dist.get(pos, UNREACHABLE)
+
+
+class BotController:
+    """管理服务器上的所有机器人玩家
+
+    机器人在服务器里和 websocket 玩家一样拥有一条蛇，决策结果由服务器通过 change_direction 应用。
+    每个tick先计算一次共享的距离场，再让每个机器人沿距离下降最快的方向走。
+    超出时间预算后，剩下的机器人退化为只避开障碍的简单策略，保证不拖慢tick。
+    """
+
+    def __init__(self, search_radius: int = 16):
+        self.bot_ids: List[str] = []
+        self.search_radius = search_radius
+        self.field = DistanceField()
+        self.next_bot = 0  # 轮转起点，预算不足时让每个机器人轮流获得完整决策
+        self.degraded = 0  # 上一个tick中退化决策的机器人数量
+
+    def add(self, player_id: str):
+        self.bot_ids.append(player_id)
+
+    def remove(self, player_id: str):
+        if player_id in self.bot_ids:
+            self.bot_ids.remove(player_id)
+
+    def search_region(self, server) -> Optional[Set[Tuple[int, int]]]:
+        """机器人附近的区块集合；地图较小时直接搜索整张地图"""
+        if server.GRID_WIDTH * server.GRID_HEIGHT <= (2 * self.search_radius) ** 2:
+            return None
+
+        chunk_size = server.snake_index.chunk_size
+        reach = -(-self.search_radius // chunk_size)
+        region = set()
+        for player_id in self.bot_ids:
+            snake = server.snakes.get(player_id)
+            if not snake or not snake.alive:
+                continue
+            cx, cy = server.snake_index.chunk_of(snake.body[0])
+            for x in range(cx - reach, cx + reach + 1):
+                for y in range(cy - reach, cy + reach + 1):
+                    region.add((x, y))
+        return region
+
+    def update(self, server, budget: float) -> List[Tuple[str, str]]:
+        """为所有机器人选择方向，返回 [(玩家ID, 方向名)]，总耗时控制在 budget 秒以内"""
+        decisions = []
+        if not self.bot_ids:
+            return decisions
+
+        start = time.perf_counter()
+        deadline = start + budget
+        # 距离场最多使用一半预算，剩下的留给每个机器人的决策
+        self.field.compute(server.GRID_WIDTH, server.GRID_HEIGHT, server.snake_index,
+                           server.food_index, self.search_region(server), start + budget / 2)
+
+        self.degraded = 0
+        count = len(self.bot_ids)
+        for offset in range(count):
+            player_id = self.bot_ids[(self.next_bot + offset) % count]
+            snake = server.snakes.get(player_id)
+            if not snake or not snake.alive:
+                continue
+
+            if time.perf_counter() < deadline:
+                direction = self.choose_direction(server, snake)
+            else:
+                direction = self.choose_safe_direction(server, snake)
+                self.degraded += 1
+            if direction:
+                decisions.append((player_id, direction))
+
+        self.next_bot = (self.next_bot + 1) % count
+        return decisions
+
+    def candidate_moves(self, server, snake):
+        """不回头的三个方向及其目标格子，只保留安全的格子"""
+        head = snake.body[0]
+        current = snake.direction.name
+        moves = []
+        for name, (dx, dy) in DIRECTION_VECTORS.items():
+            if name == OPPOSITE[current]:
+                continue
+            pos = (head[0] + dx, head[1] + dy)
+            if (0 <= pos[0] < server.GRID_WIDTH and 0 <= pos[1] < server.GRID_HEIGHT and
+                    server.snake_index.is_free(pos)):
+                moves.append((name, pos))
+        return moves
+
+    def choose_direction(self, server, snake) -> Optional[str]:
+        """完整决策：选择距离场中离食物最近的安全格子，距离相同优先保持方向"""
+        moves = self.candidate_moves(server, snake)
+        if not moves:
+            return None
+
+        current = snake.direction.name
+        best = min(moves, key=lambda move: (self.field.get(move[1]), move[0] != current,
+                                            -self.free_neighbors(server, move[1])))
+        return best[0]
+
+    def choose_safe_direction(self, server, snake) -> Optional[str]:
+        """退化决策：前方安全就保持方向，否则随便选一个安全方向"""
+        moves = self.candidate_moves(server, snake)
+        current = snake.direction.name
+        for name, _ in moves:
+            if name == current:
+                return name
+        return moves[0][0] if moves else None
+
+    def free_neighbors(self, server, pos: Tuple[int, int]) -> int:
+        """格子周围空闲格子的数量，用来避免钻进死胡同"""
+        count = 0
+        for dx, dy in DIRECTION_VECTORS.values():
+            nx, ny = pos[0] + dx, pos[1] + dy
+            if 0 <= nx < server.GRID_WIDTH and 0 <= ny < server.GRID_HEIGHT and server.snake_index.is_free((nx, ny)):
+                count += 1
+        return count
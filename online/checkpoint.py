@@ -0,0 +1,41 @@
+import json
+import os
+import tempfile
+import zlib
+from typing import Optional
+
+# 检查点文件：zlib 压缩的 JSON，开头是魔数和版本号
+MAGIC = b"SNCP"
+VERSION = 1
+MAX_AGE = 300.0  # 超过这个秒数的检查点不再恢复（玩家早已放弃重连）
+
+
+def write_checkpoint(path: str, state: dict):
+    """先写临时文件再重命名，写到一半被杀掉也不会留下损坏的检查点"""
+    data = MAGIC + bytes([VERSION]) + zlib.compress(json.dumps(state, separators=(",", ":")).encode("utf-8"))
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".checkpoint-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def read_checkpoint(path: str) -> Optional[dict]:
+    """读取检查点；文件不存在时返回 None，格式不对时抛出 ValueError"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    if data[:len(MAGIC)] != MAGIC or data[len(MAGIC)] != VERSION:
+        raise ValueError(f"{path} 不是可识别的检查点文件")
+    try:
+        return json.loads(zlib.decompress(data[len(MAGIC) + 1:]))
+    except (zlib.error, ValueError) as e:
+        raise ValueError(f"检查点文件已损坏: {e}") from e
@@ -0,0 +1,80 @@
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from typing import Dict, Optional
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """把事件格式化为一行JSON（在后台线程中执行）"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {"ts": round(record.created, 3), "level": record.levelname, "event": record.msg}
+        data.update(getattr(record, "fields", {}))
+        return json.dumps(data, ensure_ascii=False)
+
+
+class EventLog:
+    """结构化事件日志
+
+    游戏tick中只调用 emit：经过级别和采样判断后把记录放进队列就返回，
+    格式化和写入由 QueueListener 的后台线程完成，终端卡顿或管道阻塞不会拖慢tick。
+    未调用 start() 之前 emit 什么都不做。
+    """
+
+    def __init__(self, path: Optional[str] = None, level: int = logging.INFO,
+                 sample_rates: Optional[Dict[str, float]] = None):
+        self.path = path
+        self.sample_rates = sample_rates or {}
+        # 采样使用独立的随机数生成器，不影响游戏逻辑使用的全局 random
+        self.sampler = random.Random()
+
+        self.logger = logging.Logger("snake.events", level)
+        self.queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        self.listener: Optional[logging.handlers.QueueListener] = None
+        self.output: Optional[logging.Handler] = None
+
+    def start(self):
+        if self.listener is not None:
+            return
+        if self.path:
+            self.output = logging.FileHandler(self.path, encoding="utf-8")
+        else:
+            self.output = logging.StreamHandler(sys.stdout)
+        self.output.setFormatter(JsonLinesFormatter())
+
+        self.logger.addHandler(logging.handlers.QueueHandler(self.queue))
+        self.listener = logging.handlers.QueueListener(self.queue, self.output)
+        self.listener.start()
+
+    def stop(self):
+        """停止后台线程，队列中剩余的事件会先写完"""
+        if self.listener is None:
+            return
+        self.listener.stop()
+        self.output.close()
+        self.logger.handlers.clear()
+        self.listener = None
+
+    def set_level(self, level: int):
+        self.logger.setLevel(level)
+
+    def emit(self, event: str, level: int = logging.INFO, **fields):
+        """记录一个事件，fields 为附加的结构化字段"""
+        if self.listener is None or not self.logger.isEnabledFor(level):
+            return
+        rate = self.sample_rates.get(event, 1.0)
+        if rate < 1.0 and self.sampler.random() >= rate:
+            return
+        self.logger.log(level, event, extra={"fields": fields})
+
+
+def parse_sample_rates(specs) -> Dict[str, float]:
+    """解析命令行中的 事件名=采样率 列表，例如 ["food=0.1", "respawn=0.5"]"""
+    rates = {}
+    for spec in specs or []:
+        event, _, rate = spec.partition("=")
+        rates[event] = float(rate)
+    return rates
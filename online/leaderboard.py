@@ -0,0 +1,129 @@
+import bisect
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class Leaderboard:
+    """服务器排行榜：记录每个玩家的历史最高分
+
+    - 内存中维护一个按分数排序的前 K 名列表，每次得分只做一次二分插入，不需要整体排序
+    - version 只在前 K 名的顺序或分数变化时递增，服务器据此决定是否推送
+    - 修改先放进待写队列，由后台线程定期批量写入 SQLite
+    """
+
+    def __init__(self, db_path: str = "leaderboard.db", top_k: int = 10, flush_interval: float = 2.0):
+        self.db_path = db_path
+        self.top_k = top_k
+        self.flush_interval = flush_interval
+
+        self.best: Dict[str, int] = {}
+        self.names: Dict[str, str] = {}
+        self.top: List[Tuple[int, str]] = []  # (-分数, 玩家ID)，升序即分数从高到低
+        self.version = 0
+
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Tuple[str, int, float]] = {}
+        self._dirty = threading.Event()
+        self._closing = threading.Event()
+
+        self.load()
+        self._thread = threading.Thread(target=self._writer, name="leaderboard-writer", daemon=True)
+        self._thread.start()
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            "player_id TEXT PRIMARY KEY, name TEXT NOT NULL, best INTEGER NOT NULL, updated REAL NOT NULL)"
+        )
+        return connection
+
+    def load(self):
+        """启动时读取历史前 K 名"""
+        try:
+            connection = self.connect()
+            try:
+                rows = connection.execute(
+                    "SELECT player_id, name, best FROM scores ORDER BY best DESC LIMIT ?", (self.top_k,)
+                ).fetchall()
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            print(f"* 读取排行榜失败: {e}")
+            return
+
+        for player_id, name, best in rows:
+            self.best[player_id] = best
+            self.names[player_id] = name
+            self.top.append((-best, player_id))
+        self.top.sort()
+
+    def record(self, player_id: str, name: str, score: int) -> bool:
+        """记录一次得分，只有刷新了该玩家的最高分才会更新；前 K 名变化时返回 True"""
+        self.names[player_id] = name
+        previous = self.best.get(player_id, 0)
+        if score <= previous:
+            return False
+        self.best[player_id] = score
+
+        with self._lock:
+            self._pending[player_id] = (name, score, time.time())
+        self._dirty.set()
+
+        # 最高分只增不减，所以被挤出前 K 名的玩家不会再回来填补空位
+        entry = (-previous, player_id)
+        index = bisect.bisect_left(self.top, entry)
+        if index < len(self.top) and self.top[index] == entry:
+            del self.top[index]
+        elif len(self.top) >= self.top_k and (-score, player_id) >= self.top[-1]:
+            return False
+
+        bisect.insort(self.top, (-score, player_id))
+        del self.top[self.top_k:]
+        self.version += 1
+        return True
+
+    def entries(self) -> List[dict]:
+        return [{"player_id": player_id, "name": self.names.get(player_id, player_id[:8]), "score": -neg_score}
+                for neg_score, player_id in self.top]
+
+    def close(self):
+        """立即写入剩余的修改并停止后台线程"""
+        self._closing.set()
+        self._dirty.set()
+        self._thread.join()
+
+    def _writer(self):
+        connection: Optional[sqlite3.Connection] = None
+        try:
+            connection = self.connect()
+            while True:
+                self._dirty.wait()
+                # 攒一段时间的修改再批量写入（关闭时立即写入）
+                self._closing.wait(self.flush_interval)
+                self._dirty.clear()
+                self._flush(connection)
+                if self._closing.is_set():
+                    break
+        except sqlite3.Error as e:
+            print(f"* 排行榜数据库错误: {e}")
+        finally:
+            if connection is not None:
+                connection.close()
+
+    def _flush(self, connection: sqlite3.Connection):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        rows = [(player_id, name, score, updated) for player_id, (name, score, updated) in pending.items()]
+        with connection:
+            connection.executemany(
+                "INSERT INTO scores (player_id, name, best, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(player_id) DO UPDATE SET name = excluded.name, "
+                "best = MAX(best, excluded.best), updated = excluded.updated",
+                rows,
+            )
@@ -0,0 +1,205 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+import websockets
+
+from online.event_log import EventLog
+from online.snake_game_ol_server import GameServer
+from online.tick_policy import HOST_LOAD, TickPolicy
+from online.transport import UdpServerProtocol
+
+
+class QueueEntry:
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()  # 结果为分配到的房间
+        self.queued_at = time.time()
+
+
+class Lobby:
+    """匹配大厅：新连接先排队，按节奏分批放进有空位的房间，房间都满时开新房间
+
+    - 排队中的客户端会收到 {"type": "queue", "position": n, "size": m}，放行后收到正常的 welcome
+    - 每秒最多放行 admit_rate 人；本进程的tick负载过高时降到每 OVERLOAD_ADMIT_INTERVAL 秒放行一人，
+      重启后大量客户端同时重连也不会一下子压垮tick循环，同时排队的玩家也不会一直等下去
+    - 带恢复令牌的连接不排队，直接回到原来的房间（位置一直为其保留）
+    """
+
+    ADMIT_INTERVAL = 0.1
+    OVERLOAD_ADMIT_INTERVAL = 1.0
+    CLEANUP_INTERVAL = 5.0
+
+    def __init__(self, room_factory: Callable[[], GameServer], max_rooms: int = 4, admit_rate: float = 20.0,
+                 max_queue: int = 1000, event_log: Optional[EventLog] = None):
+        self.room_factory = room_factory
+        self.max_rooms = max_rooms
+        self.admit_rate = admit_rate
+        self.max_queue = max_queue
+        self.events = event_log if event_log is not None else EventLog()
+
+        self.rooms: List[GameServer] = []
+        self.room_ids: Dict[GameServer, int] = {}
+        self.next_room_id = 1
+        self.reserved: Dict[GameServer, int] = {}  # 已放行但还没完成注册的人数
+        self.queue: Deque[QueueEntry] = deque()
+        self.wake = asyncio.Event()
+        self.positions_dirty = False  # 有人离开队列，需要重新通知排队位置
+        self.admit_task: Optional[asyncio.Task] = None
+
+        # 所有房间共用一个UDP端口，按令牌分发到对应房间
+        self.udp_endpoint: Optional[UdpServerProtocol] = None
+        self.udp_port: Optional[int] = None
+
+    def start(self):
+        self.admit_task = asyncio.create_task(self.admit_loop())
+
+    def create_room(self) -> GameServer:
+        room = self.room_factory()
+        room.udp_endpoint, room.udp_port = self.udp_endpoint, self.udp_port
+        self.rooms.append(room)
+        self.room_ids[room] = self.next_room_id
+        self.next_room_id += 1
+        self.events.emit("room_open", room=self.room_ids[room], rooms=len(self.rooms))
+        return room
+
+    async def start_udp(self, host: str, port: int):
+        loop = asyncio.get_running_loop()
+        _, self.udp_endpoint = await loop.create_datagram_endpoint(
+            lambda: UdpServerProtocol(self.handle_datagram), local_addr=(host, port))
+        self.udp_port = port
+        for room in self.rooms:
+            room.udp_endpoint, room.udp_port = self.udp_endpoint, port
+
+    def handle_datagram(self, message: dict, addr):
+        token = message.get("token")
+        for room in self.rooms:
+            if token in room.udp_tokens:
+                room.handle_datagram(message, addr)
+                return
+
+    def free_slots(self, room: GameServer) -> int:
+        return room.MAX_PLAYERS - len(room.players) - len(room.suspended) - self.reserved.get(room, 0)
+
+    def room_for_admission(self) -> Optional[GameServer]:
+        """优先填满人最多的房间，都满时开新房间；达到房间上限时返回 None"""
+        open_rooms = [room for room in self.rooms if self.free_slots(room) > 0]
+        if open_rooms:
+            return min(open_rooms, key=self.free_slots)
+        if len(self.rooms) < self.max_rooms:
+            return self.create_room()
+        return None
+
+    async def handle_connection(self, websocket):
+        """websockets 的连接入口"""
+        token = GameServer.query_params(websocket).get("resume")
+        if token:
+            for room in self.rooms:
+                if token in room.resume_tokens:
+                    await room.register_player(websocket)
+                    return
+
+        if len(self.queue) >= self.max_queue:
+            self.events.emit("queue_full", logging.WARNING, size=len(self.queue))
+            await websocket.send(json.dumps({"type": "error", "message": "排队人数过多，请稍后再试"}))
+            await websocket.close()
+            return
+
+        entry = QueueEntry(websocket)
+        self.queue.append(entry)
+        self.wake.set()
+        try:
+            await websocket.send(self.queue_message(len(self.queue)))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+        # 等待放行；排队期间断开的连接直接离开队列，后面的玩家由放行循环通知新的位置
+        closed = asyncio.ensure_future(websocket.wait_closed())
+        await asyncio.wait({entry.future, closed}, return_when=asyncio.FIRST_COMPLETED)
+        if not entry.future.done():
+            entry.future.cancel()
+            self.queue.remove(entry)
+            self.positions_dirty = True
+            return
+        closed.cancel()
+
+        room = entry.future.result()
+        self.events.emit("admit", room=self.room_ids.get(room), waited=round(time.time() - entry.queued_at, 2))
+        # 等房间状态从工作线程交还后再释放预留：从这里到 add_player 返回之间没有 await，
+        # 玩家加入 players 之前不会有其他放行占用这个空位
+        await room.state_ready()
+        self.reserved[room] -= 1
+        player_id = room.add_player(websocket, room.query_params(websocket))
+        if player_id is None:
+            await room.reject_full(websocket)
+            return
+        await room.start_player(player_id, websocket)
+
+    def queue_message(self, position: int) -> str:
+        return json.dumps({"type": "queue", "position": position, "size": len(self.queue)})
+
+    def admit_batch(self, limit: int) -> int:
+        """按队列顺序放行最多 limit 人，返回实际放行的人数"""
+        admitted = 0
+        while self.queue and admitted < limit:
+            entry = self.queue[0]
+            if entry.future.done():
+                self.queue.popleft()  # 排队时已断开
+                continue
+            room = self.room_for_admission()
+            if room is None:
+                break
+            self.queue.popleft()
+            self.reserved[room] = self.reserved.get(room, 0) + 1
+            entry.future.set_result(room)
+            admitted += 1
+        return admitted
+
+    async def send_positions(self):
+        """队列前进后通知仍在排队的客户端新的位置"""
+        for position, entry in enumerate(list(self.queue), 1):
+            if entry.future.done():
+                continue
+            try:
+                await entry.websocket.send(self.queue_message(position))
+            except websockets.exceptions.ConnectionClosed:
+                pass
+
+    def close_empty_rooms(self):
+        """关闭没人的额外房间（第一个房间一直保留）"""
+        for room in self.rooms[1:]:
+            if not room.players and not room.suspended and not self.reserved.get(room):
+                room.game_running = False
+                self.rooms.remove(room)
+                self.reserved.pop(room, None)
+                self.events.emit("room_closed", room=self.room_ids.pop(room), rooms=len(self.rooms))
+
+    async def admit_loop(self):
+        # 放行速度很低时拉长间隔，而不是每个间隔至少放行一人
+        interval = max(self.ADMIT_INTERVAL, 1.0 / self.admit_rate)
+        batch = max(1, round(self.admit_rate * interval))
+        last_cleanup = time.time()
+        while True:
+            if not self.queue:
+                self.wake.clear()
+                try:
+                    await asyncio.wait_for(self.wake.wait(), self.CLEANUP_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                # 只看本进程的tick负载（系统平均负载会被其他进程抬高，而且要一分钟才降下来）；
+                # 过载时放慢而不是停止放行
+                overloaded = HOST_LOAD.tick_load() > TickPolicy.HIGH_LOAD
+                if self.admit_batch(1 if overloaded else batch):
+                    self.positions_dirty = True
+                if self.positions_dirty:
+                    self.positions_dirty = False
+                    await self.send_positions()
+                await asyncio.sleep(self.OVERLOAD_ADMIT_INTERVAL if overloaded else interval)
+
+            if time.time() - last_cleanup >= self.CLEANUP_INTERVAL:
+                self.close_empty_rooms()
+                last_cleanup = time.time()
@@ -0,0 +1,44 @@
+import json
+import queue
+import threading
+from typing import Optional
+
+
+class MatchRecorder:
+    """把对局逐帧录制为 JSON lines 文件，供 replay_render.py 离线渲染
+
+    第一行是对局信息（地图大小、颜色、tick 速率），之后每行一帧完整的 game_state。
+    tick 中只做一次 json.dumps 并放进队列，写文件由后台线程完成。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.queue: "queue.SimpleQueue[Optional[str]]" = queue.SimpleQueue()
+        self.thread: Optional[threading.Thread] = None
+        self.frames = 0
+
+    def start(self, header: dict):
+        self.queue.put(json.dumps({"type": "match", **header}, ensure_ascii=False))
+        self.thread = threading.Thread(target=self._writer, name="match-recorder", daemon=True)
+        self.thread.start()
+
+    def record(self, state: dict):
+        self.queue.put(json.dumps(state, ensure_ascii=False))
+        self.frames += 1
+
+    def close(self):
+        """写完队列中剩余的帧后停止后台线程"""
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+
+    def _writer(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            while True:
+                line = self.queue.get()
+                if line is None:
+                    break
+                f.write(line)
+                f.write("\n")
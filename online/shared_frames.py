@@ -0,0 +1,142 @@
+import argparse
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional, Tuple
+
+# 共享内存布局：
+#   头部     PUBLISHED：已发布的帧数 n（最新一帧在槽位 n % 2）
+#   两个槽位 SLOT_HEADER：槽位序号（写入中为奇数）+ 帧长度，后面是帧数据
+# 写入方只写另一个槽位，写之前把槽位序号改成奇数、写完改成偶数；
+# 读取方读数据前后各读一次槽位序号，两次相同且为偶数说明读到的数据完整（seqlock），不需要锁。
+PUBLISHED = struct.Struct("<Q")
+SLOT_HEADER = struct.Struct("<QI")
+DEFAULT_CAPACITY = 1 << 20
+# 读取方遇到写入中的槽位时最多重试的次数；写入方在写入途中退出时槽位序号会一直是奇数
+MAX_READ_RETRIES = 100
+
+
+class FramePublisher:
+    """游戏进程把每个tick的二进制状态帧发布到共享内存，同机的其他进程（观战转发、监控、机器人）直接读取"""
+
+    def __init__(self, name: str, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.slot_size = SLOT_HEADER.size + capacity
+        size = PUBLISHED.size + 2 * self.slot_size
+        try:
+            self.memory = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            # 上次的进程崩溃后留下的同名共享内存：大小一致时接着原来的帧编号继续发布，
+            # 已经附加的读取方不受影响；大小不同时删除后重建
+            self.memory = shared_memory.SharedMemory(name)
+            if self.memory.size != size:
+                self.memory.close()
+                self.memory.unlink()
+                self.memory = shared_memory.SharedMemory(name, create=True, size=size)
+            else:
+                self.buffer = self.memory.buf
+                self.published = PUBLISHED.unpack_from(self.buffer, 0)[0]
+                return
+        self.buffer = self.memory.buf
+        self.buffer[:PUBLISHED.size + 2 * SLOT_HEADER.size] = bytes(PUBLISHED.size + 2 * SLOT_HEADER.size)
+        self.published = 0
+
+    def publish(self, frame: bytes) -> bool:
+        """发布一帧；超过槽位容量的帧不发布，返回 False"""
+        if len(frame) > self.capacity:
+            return False
+        count = self.published + 1
+        offset = PUBLISHED.size + (count % 2) * self.slot_size
+        slot_seq = 2 * count
+
+        SLOT_HEADER.pack_into(self.buffer, offset, slot_seq - 1, 0)  # 奇数：正在写入
+        start = offset + SLOT_HEADER.size
+        self.buffer[start:start + len(frame)] = frame
+        SLOT_HEADER.pack_into(self.buffer, offset, slot_seq, len(frame))
+        PUBLISHED.pack_into(self.buffer, 0, count)
+        self.published = count
+        return True
+
+    def close(self):
+        self.buffer.release()
+        self.memory.close()
+        self.memory.unlink()
+
+
+class FrameReader:
+    """读取 FramePublisher 发布的最新一帧"""
+
+    def __init__(self, name: str):
+        self.memory = shared_memory.SharedMemory(name)
+        # 读取方只是附加到已有的共享内存，不能让 resource_tracker 在退出时把它删掉
+        resource_tracker.unregister(self.memory._name, "shared_memory")
+        self.buffer = self.memory.buf
+        self.slot_size = (len(self.buffer) - PUBLISHED.size) // 2
+        self.last_read = 0
+
+    def view(self) -> Optional[Tuple[int, memoryview, int]]:
+        """返回 (帧编号, 帧数据的只读视图, 槽位序号)，不拷贝数据；还没有帧或一直读不到完整的帧时返回 None
+
+        视图在写入方再发布两帧后会被覆盖，使用完后应调用 valid() 确认期间没有被改写。
+        """
+        for _ in range(MAX_READ_RETRIES):
+            count = PUBLISHED.unpack_from(self.buffer, 0)[0]
+            if count == 0:
+                return None
+            offset = PUBLISHED.size + (count % 2) * self.slot_size
+            slot_seq, length = SLOT_HEADER.unpack_from(self.buffer, offset)
+            if slot_seq % 2 == 0:
+                start = offset + SLOT_HEADER.size
+                return count, self.buffer[start:start + length].toreadonly(), slot_seq
+        return None
+
+    def valid(self, count: int, slot_seq: int) -> bool:
+        offset = PUBLISHED.size + (count % 2) * self.slot_size
+        return SLOT_HEADER.unpack_from(self.buffer, offset)[0] == slot_seq
+
+    def read(self) -> Optional[Tuple[int, bytes]]:
+        """拷贝出最新一帧，保证数据完整；没有新帧时返回 None"""
+        for _ in range(MAX_READ_RETRIES):
+            latest = self.view()
+            if latest is None or latest[0] == self.last_read:
+                return None
+            count, view, slot_seq = latest
+            frame = bytes(view)
+            view.release()
+            if self.valid(count, slot_seq):
+                self.last_read = count
+                return count, frame
+        return None
+
+    def close(self):
+        self.buffer.release()
+        self.memory.close()
+
+
+def main(argv=None):
+    """简单的读取示例：定期打印最新一帧的概况"""
+    from online.world_state import decode_frame
+
+    parser = argparse.ArgumentParser(description="读取服务器发布到共享内存的状态帧")
+    parser.add_argument("name", help="共享内存名称（服务器的 --publish-shm 参数）")
+    parser.add_argument("--interval", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    reader = FrameReader(args.name)
+    try:
+        while True:
+            latest = reader.read()
+            if latest is not None:
+                count, frame = latest
+                state = decode_frame(frame)
+                print(f"帧 {count}: tick {state['tick']}，{len(state['snakes'])} 条蛇，"
+                      f"{len(state['foods'])} 个食物，{len(frame)} 字节")
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,18 @@
 import pygame
+import argparse
 import asyncio
 import websockets
 import json
 import queue
 import time
+import math
+from collections import deque
 from enum import Enum
 
-# 初始化pygame
-pygame.init()
+from client_startup import LazyFont, init_pygame
+from frame_profiler import FrameProfiler
+from online.transport import PING_INTERVAL, REDUNDANT_INPUTS, LatencyStats, UdpClientProtocol
+from online.world_state import decode_frame
 
 
 class Direction(Enum):
@@ -30,46 +35,8 @@ class Colors:
     FOOD_GLOW = (255, 255, 128)
 
 
-def get_chinese_font(size):
-    """获取支持中文的字体"""
-    import platform
-    import os
-
-    system = platform.system()
-    chinese_fonts = []
-
-    if system == "Windows":
-        chinese_fonts = [
-            "C:/Windows/Fonts/msyh.ttc",
-            "C:/Windows/Fonts/simhei.ttf",
-            "C:/Windows/Fonts/simsun.ttc",
-        ]
-    elif system == "Darwin":  # macOS
-        chinese_fonts = [
-            "/System/Library/Fonts/PingFang.ttc",
-            "/System/Library/Fonts/STHeiti Light.ttc",
-        ]
-    else:  # Linux
-        chinese_fonts = [
-            "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
-            "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
-        ]
-
-    for font_path in chinese_fonts:
-        try:
-            if os.path.exists(font_path):
-                return pygame.font.Font(font_path, size)
-        except:
-            continue
-
-    try:
-        return pygame.font.Font(None, size)
-    except:
-        return pygame.font.Font(None, size)
-
-
 class SnakeClient:
-    def __init__(self):
+    def __init__(self, use_udp: bool = False):
         # 初始窗口尺寸（可调整）
         self.WINDOW_WIDTH = 1400
         self.WINDOW_HEIGHT = 900
@@ -78,13 +45,18 @@ class SnakeClient:
         self.GRID_SIZE = 20
 
         # 创建可调整大小的窗口
+        init_pygame()
         self.screen = pygame.display.set_mode((self.WINDOW_WIDTH, self.WINDOW_HEIGHT), pygame.RESIZABLE)
         pygame.display.set_caption("贪吃蛇Online - Snake Game Online")
 
         self.clock = pygame.time.Clock()
-        self.font_large = get_chinese_font(36)
-        self.font_medium = get_chinese_font(24)
-        self.font_small = get_chinese_font(18)
+        self.font_large = LazyFont(36)
+        self.font_medium = LazyFont(24)
+        self.font_small = LazyFont(18)
+
+        # 分阶段帧计时（F3 显示/隐藏，F4 导出追踪文件）
+        self.profiler = FrameProfiler()
+        self.profiler_font = LazyFont(14)
 
         # 网络相关
         self.websocket = None
@@ -94,12 +66,56 @@ class SnakeClient:
         self.pending_connection = False
         self.connection_task = None
 
+        # 可选的UDP状态帧通道（服务器开启且客户端使用 --udp 时生效）
+        self.use_udp = use_udp
+        self.udp = None
+        self.udp_token = None
+        self.udp_active = False  # 已经通过UDP收到状态帧
+        self.udp_task = None
+        self.last_frame_seq = -1  # 最近处理的状态帧序号，更旧的帧直接丢弃
+        self.input_seq = 0
+        self.recent_inputs = deque(maxlen=REDUNDANT_INPUTS)
+        # 已发送但还没被服务器确认的输入：序号 -> 发送时间，用于统计输入生效延迟
+        self.pending_inputs = {}
+        self.input_latency = None  # 最近一次输入从发送到生效的毫秒数
+        self.input_latency_avg = None  # 平滑后的输入延迟
+
         # 游戏状态
         self.game_state = None
         self.my_color = None
         self.grid_width = 50
         self.grid_height = 35
         self.colors = []
+        # 大地图模式下服务器只同步视野内的实体，view_x/view_y 为视野左上角的世界坐标
+        self.world_width = 50
+        self.world_height = 35
+        self.view_x = 0
+        self.view_y = 0
+
+        # 镜头模式：跟随自己的蛇头按固定缩放绘制，只画屏幕内可见的格子
+        self.camera_mode = False
+        self.camera_auto = True  # 地图放不下时自动开启，按 C 键手动切换后不再自动
+        self.zoom = 20  # 镜头模式下每格的像素大小
+        self.MIN_ZOOM = 6
+        self.MAX_ZOOM = 40
+        self.camera_x = 25.0  # 镜头中心的世界坐标
+        self.camera_y = 17.5
+        self.board_rect = pygame.Rect(50, 80, self.WINDOW_WIDTH - 100, self.WINDOW_HEIGHT - 150)
+        self.cell_map = {}  # 世界坐标 -> (是否蛇头, 玩家ID, 颜色信息)，每收到一帧重建一次
+        self.food_cells = []
+
+        # 小地图：每个像素对应若干个格子，收到新状态时更新，每帧只做一次缩放blit
+        self.MINIMAP_SIZE = 160
+        self.minimap_surface = None
+        self.minimap_dirty = True
+
+        # 格子小于阈值时改用低分辨率表面：每个格子一个像素，收到新状态时用 PixelArray 写入，
+        # 绘制时整体缩放一次blit，每帧开销与蛇的长度和数量无关
+        self.CELL_SURFACE_THRESHOLD = 12
+        self.cell_surface = None  # 每格一个像素
+        self.cell_surface_origin = (0, 0)  # cell_surface 左上角对应的世界坐标
+        self.cell_surface_dirty = True
+        self.cell_surface_scaled = None  # 按当前格子大小缩放后的 cell_surface（非镜头模式）
 
         # 计算初始游戏区域偏移
         self.update_game_layout()
@@ -108,6 +124,19 @@ class SnakeClient:
         self.connection_status = "未连接"
         self.last_ping = time.time()
 
+        # 应用层 ping/pong：估计往返时延、抖动和与服务器的时钟偏差
+        self.latency = LatencyStats()
+        self.ping_task = None
+
+        # 断线恢复：welcome 中的恢复令牌，意外断线后在保留时间内自动带令牌重连
+        self.resume_token = None
+        self.resume_grace = 0.0
+        self.disconnected_at = None
+
+        # 服务器推送的排行榜，只在排行变化时收到，文字提前渲染好
+        self.leaderboard = None
+        self.leaderboard_surfaces = []
+
         # 调试信息
         self.debug_info = []
 
@@ -121,6 +150,16 @@ class SnakeClient:
 
     def update_game_layout(self):
         """更新游戏布局以适应窗口大小"""
+        if self.camera_auto:
+            # 最小10像素仍放不下整个地图时，自动切换到镜头模式
+            self.camera_mode = (self.world_width * 10 > self.WINDOW_WIDTH - 100 or
+                                self.world_height * 10 > self.WINDOW_HEIGHT - 150)
+
+        if self.camera_mode:
+            self.GRID_SIZE = self.zoom
+            self.board_rect = pygame.Rect(50, 80, self.WINDOW_WIDTH - 100, self.WINDOW_HEIGHT - 150)
+            return
+
         # 确保游戏区域能够适应窗口
         max_game_width = self.WINDOW_WIDTH - 100  # 留出边距
         max_game_height = self.WINDOW_HEIGHT - 150  # 留出UI空间
@@ -153,17 +192,23 @@ class SnakeClient:
         self.pending_connection = True
         try:
             self.connection_status = "连接中..."
+            # 请求二进制状态帧（服务器在视野模式下仍发送JSON）
+            url = "ws://localhost:8765/?binary=1"
+            if self.resume_token:
+                url += f"&resume={self.resume_token}"
             self.add_debug_info("开始连接到 ws://localhost:8765")
 
             # 添加连接超时
             self.websocket = await asyncio.wait_for(
-                websockets.connect("ws://localhost:8765"),
+                websockets.connect(url),
                 timeout=10.0
             )
 
             self.connected = True
             self.connection_status = "已连接"
             self.add_debug_info("* 成功连接到游戏服务器")
+            self.latency = LatencyStats()
+            self.ping_task = asyncio.create_task(self.ping_loop())
 
             # 启动消息接收循环
             await self.receive_messages()
@@ -181,6 +226,9 @@ class SnakeClient:
             self.add_debug_info(f"* 连接失败: {e}")
             self.connected = False
         finally:
+            if self.ping_task:
+                self.ping_task.cancel()
+                self.ping_task = None
             self.pending_connection = False
             self.add_debug_info("connect_to_server 方法执行完毕")
 
@@ -189,50 +237,180 @@ class SnakeClient:
         self.add_debug_info("开始接收服务器消息")
         try:
             async for message in self.websocket:
-                data = json.loads(message)
-                self.message_queue.put(data)
+                data = decode_frame(message) if isinstance(message, bytes) else json.loads(message)
                 self.last_ping = time.time()
+                # pong 在收到时立即处理，不经过按帧处理的消息队列，避免把渲染间隔算进RTT
+                if data.get("type") == "pong":
+                    self.handle_pong(data)
+                    continue
+                self.message_queue.put(data)
+            # 服务器正常关闭连接（例如重启时的 1001）不会抛出异常，循环直接结束
+            self.add_debug_info("* 服务器关闭了连接")
+            self.connection_status = "连接断开"
         except websockets.exceptions.ConnectionClosed:
             self.add_debug_info("* 与服务器的连接已断开")
-            self.connected = False
             self.connection_status = "连接断开"
         except Exception as e:
             self.add_debug_info(f"* 接收消息时出错: {e}")
-            self.connected = False
             self.connection_status = f"错误: {str(e)}"
+        finally:
+            # 无论连接以哪种方式结束都记为断线，主循环据此带恢复令牌自动重连
+            self.connected = False
+            self.disconnected_at = time.time()
+
+    async def resume_session(self):
+        """意外断线后带恢复令牌重连，直到成功或超过服务器的保留时间"""
+        deadline = self.disconnected_at + self.resume_grace
+        delay = 0.2
+        while time.time() < deadline:
+            self.connection_status = "重连中..."
+            self.add_debug_info("* 尝试恢复断线前的会话")
+            self.disconnected_at = None
+            await self.connect_to_server()
+            if self.disconnected_at is not None:
+                return  # 连上过，这次连接的断开由主循环重新处理
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 2.0)
+
+        self.add_debug_info("* 会话已过期，按空格键重新加入")
+        self.resume_token = None
+        self.connection_status = "连接断开"
+
+    async def ping_loop(self):
+        """定期发送 ping，顺带上报最近测得的RTT供服务器统计"""
+        while self.connected and self.websocket:
+            try:
+                await self.websocket.send(json.dumps({"type": "ping", "t": time.time(), "rtt": self.latency.last}))
+            except Exception as e:
+                self.add_debug_info(f"* 发送ping失败: {e}")
+                return
+            await asyncio.sleep(PING_INTERVAL)
+
+    def handle_pong(self, data):
+        sent = data.get("t")
+        if not isinstance(sent, (int, float)):
+            return
+        self.latency.add((time.time() - sent) * 1000, sent, data.get("server_time"))
 
     async def send_direction(self, direction: str):
         """发送方向指令到服务器"""
+        self.input_seq += 1
+        self.recent_inputs.append([self.input_seq, direction])
+        self.pending_inputs[self.input_seq] = time.time()
+
+        if self.udp_active:
+            # UDP数据报可能丢失，每次都附带最近几次输入，服务器按序号去重
+            self.udp.send({"type": "input", "token": self.udp_token, "inputs": list(self.recent_inputs)})
+            return
+
         if self.connected and self.websocket:
             try:
                 message = json.dumps({
                     "type": "direction",
-                    "direction": direction
+                    "direction": direction,
+                    "seq": self.input_seq
                 })
                 await self.websocket.send(message)
             except Exception as e:
                 self.add_debug_info(f"* 发送方向指令失败: {e}")
 
+    async def start_udp(self, udp_info):
+        """建立UDP状态帧通道，握手数据报可能丢失，所以重复发送直到收到第一帧"""
+        loop = asyncio.get_running_loop()
+        try:
+            _, self.udp = await loop.create_datagram_endpoint(
+                lambda: UdpClientProtocol(self.on_udp_message), remote_addr=("localhost", udp_info["port"]))
+        except OSError as e:
+            self.add_debug_info(f"* UDP通道建立失败，继续使用websocket: {e}")
+            return
+
+        self.udp_token = udp_info["token"]
+        for _ in range(10):
+            if self.udp_active or not self.connected:
+                break
+            self.udp.send({"type": "udp_hello", "token": self.udp_token})
+            await asyncio.sleep(0.5)
+
+        if self.udp_active:
+            self.add_debug_info("* 已切换到UDP状态帧通道")
+        else:
+            self.add_debug_info("* UDP握手未成功，继续使用websocket")
+
+    def on_udp_message(self, data):
+        """UDP收到的状态帧和websocket消息一样放进消息队列"""
+        if data.get("type") == "game_state":
+            self.udp_active = True
+            self.message_queue.put(data)
+
+    def update_input_latency(self, acked_seq):
+        """服务器在某个tick消费了我们的输入后会在帧里带上它的序号，据此计算输入生效延迟"""
+        if acked_seq is None or not self.pending_inputs:
+            return
+        now = time.time()
+        for seq in [seq for seq in self.pending_inputs if seq <= acked_seq]:
+            sent = self.pending_inputs.pop(seq)
+            if seq == acked_seq:
+                self.input_latency = (now - sent) * 1000
+                if self.input_latency_avg is None:
+                    self.input_latency_avg = self.input_latency
+                else:
+                    self.input_latency_avg += (self.input_latency - self.input_latency_avg) * 0.2
+
     def process_messages(self):
         """处理接收到的消息"""
         while not self.message_queue.empty():
             try:
                 data = self.message_queue.get_nowait()
 
-                if data["type"] == "welcome":
+                if data["type"] == "queue":
+                    self.connection_status = f"排队中：第 {data['position']} 位（共 {data['size']} 人）"
+
+                elif data["type"] == "welcome":
+                    self.connection_status = "已连接"
                     self.player_id = data["player_id"]
                     self.my_color = data["color"]
+                    self.colors = data.get("colors", self.colors)
+                    self.last_frame_seq = -1
+                    self.pending_inputs.clear()
                     self.add_debug_info(f"* {data['message']}")
+                    resume = data.get("resume")
+                    if resume:
+                        self.resume_token, self.resume_grace = resume["token"], resume["grace"]
+                    if data.get("resumed"):
+                        self.add_debug_info(f"* 会话已恢复，断线期间错过 {data.get('missed_ticks', 0)} 个tick")
+                    if self.udp:
+                        self.udp.close()
+                        self.udp, self.udp_active = None, False
+                    if self.use_udp and "udp" in data:
+                        self.udp_task = asyncio.create_task(self.start_udp(data["udp"]))
 
                 elif data["type"] == "game_state":
+                    # 乱序到达的旧帧直接丢弃
+                    if data.get("seq", 0) <= self.last_frame_seq:
+                        continue
+                    self.last_frame_seq = data.get("seq", 0)
+                    self.update_input_latency(data.get("acks", {}).get(self.player_id))
+
                     self.game_state = data
-                    self.grid_width = data["grid_size"]["width"]
-                    self.grid_height = data["grid_size"]["height"]
-                    self.colors = data["colors"]
+                    self.world_width = data["grid_size"]["width"]
+                    self.world_height = data["grid_size"]["height"]
+                    if "view" in data:
+                        view = data["view"]
+                        self.view_x, self.view_y = view["x"], view["y"]
+                        self.grid_width, self.grid_height = view["width"], view["height"]
+                    else:
+                        self.view_x, self.view_y = 0, 0
+                        self.grid_width, self.grid_height = self.world_width, self.world_height
+                    self.colors = data.get("colors", self.colors)
+                    self.rebuild_cell_map()
 
                     # 重新计算游戏区域布局
                     self.update_game_layout()
 
+                elif data["type"] == "leaderboard":
+                    self.leaderboard = data["entries"]
+                    self.render_leaderboard()
+
                 elif data["type"] == "error":
                     self.add_debug_info(f"* 服务器错误: {data['message']}")
                     self.connection_status = data["message"]
@@ -278,11 +456,52 @@ class SnakeClient:
                 end_pos = (self.game_offset_x + self.grid_width * self.GRID_SIZE, self.game_offset_y + y * self.GRID_SIZE)
                 pygame.draw.line(self.screen, Colors.GRID_LINE, start_pos, end_pos, 1)
 
+    def draw_snake_cell(self, x, y, is_head, is_me, color_info):
+        """在屏幕坐标 (x, y) 绘制一节蛇身或蛇头"""
+        if is_head:  # 蛇头
+            head_rect = pygame.Rect(x + 2, y + 2, self.GRID_SIZE - 4, self.GRID_SIZE - 4)
+            self.draw_rounded_rect(self.screen, color_info["head"], head_rect, max(4, self.GRID_SIZE // 4))
+
+            # 只在网格足够大时绘制眼睛
+            if self.GRID_SIZE >= 12:
+                eye_size = max(1, self.GRID_SIZE // 8)
+                eye1_pos = (x + self.GRID_SIZE // 4, y + self.GRID_SIZE // 4)
+                eye2_pos = (x + 3 * self.GRID_SIZE // 4, y + self.GRID_SIZE // 4)
+                pygame.draw.circle(self.screen, Colors.TEXT_PRIMARY, eye1_pos, eye_size)
+                pygame.draw.circle(self.screen, Colors.TEXT_PRIMARY, eye2_pos, eye_size)
+
+            # 如果是自己的蛇，添加特殊标识
+            if is_me:
+                pygame.draw.rect(self.screen, Colors.TEXT_PRIMARY,
+                                 pygame.Rect(x, y, self.GRID_SIZE, max(2, self.GRID_SIZE // 8)))
+        else:  # 蛇身
+            body_rect = pygame.Rect(x + 3, y + 3, self.GRID_SIZE - 6, self.GRID_SIZE - 6)
+            self.draw_rounded_rect(self.screen, color_info["body"], body_rect, max(3, self.GRID_SIZE // 6))
+
+    def draw_food_cell(self, x, y):
+        """在屏幕坐标 (x, y) 绘制一个食物"""
+        # 绘制发光效果（只在网格足够大时）
+        if self.GRID_SIZE >= 15:
+            glow_surface = pygame.Surface((self.GRID_SIZE + 6, self.GRID_SIZE + 6), pygame.SRCALPHA)
+            pygame.draw.circle(glow_surface, (*Colors.FOOD_GLOW, 30),
+                               (glow_surface.get_width() // 2, glow_surface.get_height() // 2),
+                               glow_surface.get_width() // 2)
+            self.screen.blit(glow_surface, (x - 3, y - 3))
+
+        # 绘制食物
+        food_center = (x + self.GRID_SIZE // 2, y + self.GRID_SIZE // 2)
+        food_radius = max(3, (self.GRID_SIZE - 6) // 2)
+        pygame.draw.circle(self.screen, Colors.FOOD, food_center, food_radius)
+
     def draw_snakes(self):
         """绘制所有蛇"""
         if not self.game_state or "snakes" not in self.game_state:
             return
 
+        if self.use_cell_surface():
+            self.draw_cell_surface()
+            return
+
         for player_id, snake_data in self.game_state["snakes"].items():
             if not snake_data["alive"]:
                 continue
@@ -292,55 +511,255 @@ class SnakeClient:
                 continue
 
             color_info = self.colors[color_index]
-            head_color = color_info["head"]
-            body_color = color_info["body"]
+
+            # 蛇头在视野外时，收到的只是被裁剪后的蛇身
+            head_in_view = snake_data.get("head_in_view", True)
+            is_me = player_id == self.player_id
 
             # 绘制蛇身
             for i, segment in enumerate(snake_data["body"]):
-                x = self.game_offset_x + segment[0] * self.GRID_SIZE
-                y = self.game_offset_y + segment[1] * self.GRID_SIZE
-
-                if i == 0:  # 蛇头
-                    head_rect = pygame.Rect(x + 2, y + 2, self.GRID_SIZE - 4, self.GRID_SIZE - 4)
-                    self.draw_rounded_rect(self.screen, head_color, head_rect, max(4, self.GRID_SIZE // 4))
-
-                    # 只在网格足够大时绘制眼睛
-                    if self.GRID_SIZE >= 12:
-                        eye_size = max(1, self.GRID_SIZE // 8)
-                        eye1_pos = (x + self.GRID_SIZE // 4, y + self.GRID_SIZE // 4)
-                        eye2_pos = (x + 3 * self.GRID_SIZE // 4, y + self.GRID_SIZE // 4)
-                        pygame.draw.circle(self.screen, Colors.TEXT_PRIMARY, eye1_pos, eye_size)
-                        pygame.draw.circle(self.screen, Colors.TEXT_PRIMARY, eye2_pos, eye_size)
-
-                    # 如果是自己的蛇，添加特殊标识
-                    if player_id == self.player_id:
-                        pygame.draw.rect(self.screen, Colors.TEXT_PRIMARY,
-                                         pygame.Rect(x, y, self.GRID_SIZE, max(2, self.GRID_SIZE // 8)))
-                else:  # 蛇身
-                    body_rect = pygame.Rect(x + 3, y + 3, self.GRID_SIZE - 6, self.GRID_SIZE - 6)
-                    self.draw_rounded_rect(self.screen, body_color, body_rect, max(3, self.GRID_SIZE // 6))
+                x = self.game_offset_x + (segment[0] - self.view_x) * self.GRID_SIZE
+                y = self.game_offset_y + (segment[1] - self.view_y) * self.GRID_SIZE
+                self.draw_snake_cell(x, y, i == 0 and head_in_view, is_me, color_info)
 
     def draw_foods(self):
         """绘制食物"""
         if not self.game_state or "foods" not in self.game_state:
             return
 
+        # 低分辨率表面里已经包含了食物
+        if self.use_cell_surface():
+            return
+
         for food in self.game_state["foods"]:
-            x = self.game_offset_x + food["position"][0] * self.GRID_SIZE
-            y = self.game_offset_y + food["position"][1] * self.GRID_SIZE
-
-            # 绘制发光效果（只在网格足够大时）
-            if self.GRID_SIZE >= 15:
-                glow_surface = pygame.Surface((self.GRID_SIZE + 6, self.GRID_SIZE + 6), pygame.SRCALPHA)
-                pygame.draw.circle(glow_surface, (*Colors.FOOD_GLOW, 30),
-                                   (glow_surface.get_width() // 2, glow_surface.get_height() // 2),
-                                   glow_surface.get_width() // 2)
-                self.screen.blit(glow_surface, (x - 3, y - 3))
-
-            # 绘制食物
-            food_center = (x + self.GRID_SIZE // 2, y + self.GRID_SIZE // 2)
-            food_radius = max(3, (self.GRID_SIZE - 6) // 2)
-            pygame.draw.circle(self.screen, Colors.FOOD, food_center, food_radius)
+            x = self.game_offset_x + (food["position"][0] - self.view_x) * self.GRID_SIZE
+            y = self.game_offset_y + (food["position"][1] - self.view_y) * self.GRID_SIZE
+            self.draw_food_cell(x, y)
+
+    def rebuild_cell_map(self):
+        """把最新状态整理成 格子 -> 绘制信息 的映射（每收到一帧做一次，而不是每次绘制）"""
+        self.cell_map = {}
+        snakes = self.game_state.get("snakes", {})
+        for player_id, snake_data in snakes.items():
+            if not snake_data["alive"] or snake_data["color_index"] >= len(self.colors):
+                continue
+            color_info = self.colors[snake_data["color_index"]]
+            head_in_view = snake_data.get("head_in_view", True)
+            # 倒序写入，保证蛇头覆盖同一格上的蛇身
+            for i in range(len(snake_data["body"]) - 1, -1, -1):
+                segment = snake_data["body"][i]
+                self.cell_map[(segment[0], segment[1])] = (i == 0 and head_in_view, player_id, color_info)
+
+        self.food_cells = [tuple(food["position"]) for food in self.game_state.get("foods", [])]
+        self.minimap_dirty = True
+        self.cell_surface_dirty = True
+
+    def use_cell_surface(self):
+        return (self.zoom if self.camera_mode else self.GRID_SIZE) < self.CELL_SURFACE_THRESHOLD
+
+    def update_cell_surface(self):
+        """把 cell_map 和食物写入每格一个像素的表面：镜头模式只覆盖可见范围，否则覆盖当前网格"""
+        if self.camera_mode:
+            # 表面大小取决于屏幕而不是地图，大地图上也不会分配整张地图的表面
+            x0, y0, x1, y1 = self.visible_cell_rect()
+            origin, size = (x0, y0), (x1 - x0 + 1, y1 - y0 + 1)
+        else:
+            origin, size = (self.view_x, self.view_y), (self.grid_width, self.grid_height)
+        if (not self.cell_surface_dirty and self.cell_surface is not None
+                and self.cell_surface_origin == origin and self.cell_surface.get_size() == size):
+            return
+
+        if self.cell_surface is None or self.cell_surface.get_size() != size:
+            self.cell_surface = pygame.Surface(size)
+        surface = self.cell_surface
+        surface.fill((25, 25, 45))
+        map_rgb = surface.map_rgb
+        width, height = size
+        ox, oy = origin
+
+        # 和 draw_camera_view 一样：实体少时遍历实体，否则只遍历表面覆盖的格子
+        if len(self.cell_map) <= width * height:
+            cells = self.cell_map.items()
+        else:
+            cells = (((x, y), self.cell_map[(x, y)])
+                     for y in range(oy, oy + height) for x in range(ox, ox + width) if (x, y) in self.cell_map)
+
+        pixels = pygame.PixelArray(surface)
+        try:
+            colors = {}  # 颜色 -> 映射后的像素值，同一条蛇只换算一次
+            for pos, (is_head, player_id, color_info) in cells:
+                x, y = pos[0] - ox, pos[1] - oy
+                if 0 <= x < width and 0 <= y < height:
+                    if is_head:
+                        color = Colors.TEXT_PRIMARY if player_id == self.player_id else color_info["head"]
+                    else:
+                        color = color_info["body"]
+                    key = tuple(color)
+                    value = colors.get(key)
+                    if value is None:
+                        value = colors[key] = map_rgb(key)
+                    pixels[x, y] = value
+            food = map_rgb(Colors.FOOD)
+            for pos in self.food_cells:
+                x, y = pos[0] - ox, pos[1] - oy
+                if 0 <= x < width and 0 <= y < height:
+                    pixels[x, y] = food
+        finally:
+            pixels.close()
+
+        self.cell_surface_origin = origin
+        self.cell_surface_dirty = False
+        self.cell_surface_scaled = None
+
+    def draw_cell_surface(self):
+        """非镜头模式：缩放后的格子表面只在新状态或布局变化时重建，每帧一次blit"""
+        self.update_cell_surface()
+        size = (self.grid_width * self.GRID_SIZE, self.grid_height * self.GRID_SIZE)
+        if self.cell_surface_scaled is None or self.cell_surface_scaled.get_size() != size:
+            scaled = pygame.transform.scale(self.cell_surface, size)
+            # 在格子边界留1像素缝隙，让相邻的蛇身仍能分辨出一节一节
+            for x in range(0, size[0], self.GRID_SIZE):
+                pygame.draw.line(scaled, (25, 25, 45), (x, 0), (x, size[1]), 1)
+            for y in range(0, size[1], self.GRID_SIZE):
+                pygame.draw.line(scaled, (25, 25, 45), (0, y), (size[0], y), 1)
+            self.cell_surface_scaled = scaled
+        self.screen.blit(self.cell_surface_scaled, (self.game_offset_x, self.game_offset_y))
+
+    def update_camera(self):
+        """镜头平滑地跟随自己的蛇头"""
+        # 地图大小可能变化，先把镜头限制在地图范围内
+        self.camera_x = max(0.0, min(float(self.world_width), self.camera_x))
+        self.camera_y = max(0.0, min(float(self.world_height), self.camera_y))
+
+        snakes = self.game_state.get("snakes", {}) if self.game_state else {}
+        my_snake = snakes.get(self.player_id)
+        if not my_snake or not my_snake["body"]:
+            return
+
+        target_x = my_snake["body"][0][0] + 0.5
+        target_y = my_snake["body"][0][1] + 0.5
+        # 距离过远（如重生）时直接跳过去，否则做插值
+        if abs(target_x - self.camera_x) + abs(target_y - self.camera_y) > 20:
+            self.camera_x, self.camera_y = target_x, target_y
+        else:
+            self.camera_x += (target_x - self.camera_x) * 0.2
+            self.camera_y += (target_y - self.camera_y) * 0.2
+
+    def visible_cell_rect(self):
+        """镜头当前能看到的格子范围 (x0, y0, x1, y1)，闭区间，已裁剪到地图内"""
+        cols = self.board_rect.width / self.zoom
+        rows = self.board_rect.height / self.zoom
+        left = self.camera_x - cols / 2
+        top = self.camera_y - rows / 2
+        x0 = max(0, math.floor(left))
+        y0 = max(0, math.floor(top))
+        x1 = min(self.world_width - 1, math.ceil(left + cols))
+        y1 = min(self.world_height - 1, math.ceil(top + rows))
+        return x0, y0, x1, y1
+
+    def world_to_screen(self, cell_x, cell_y):
+        """世界格子坐标 -> 屏幕像素坐标（镜头模式）"""
+        left = self.camera_x - self.board_rect.width / (2 * self.zoom)
+        top = self.camera_y - self.board_rect.height / (2 * self.zoom)
+        return (int(self.board_rect.x + (cell_x - left) * self.zoom),
+                int(self.board_rect.y + (cell_y - top) * self.zoom))
+
+    def draw_camera_view(self):
+        """镜头模式：只绘制与可见矩形相交的格子，开销取决于屏幕大小而不是地图大小"""
+        self.update_camera()
+        self.draw_rounded_rect(self.screen, (25, 25, 45), self.board_rect.inflate(20, 20), 15)
+
+        x0, y0, x1, y1 = self.visible_cell_rect()
+        if x0 > x1 or y0 > y1:
+            return
+
+        self.screen.set_clip(self.board_rect)
+
+        # 地图边界内的背景和网格线
+        left, top = self.world_to_screen(x0, y0)
+        right, bottom = self.world_to_screen(x1 + 1, y1 + 1)
+        if self.zoom >= 15:
+            for x in range(x0, x1 + 2):
+                sx = self.world_to_screen(x, y0)[0]
+                pygame.draw.line(self.screen, Colors.GRID_LINE, (sx, top), (sx, bottom), 1)
+            for y in range(y0, y1 + 2):
+                sy = self.world_to_screen(x0, y)[1]
+                pygame.draw.line(self.screen, Colors.GRID_LINE, (left, sy), (right, sy), 1)
+
+        if self.use_cell_surface():
+            # 格子表面正好覆盖可见范围，整体缩放到屏幕上
+            self.update_cell_surface()
+            self.screen.blit(pygame.transform.scale(self.cell_surface, (right - left, bottom - top)), (left, top))
+            self.screen.set_clip(None)
+            return
+
+        # 已知实体少于可见格子数时遍历实体，否则遍历可见格子，两者都受屏幕大小约束
+        visible_count = (x1 - x0 + 1) * (y1 - y0 + 1)
+        if len(self.cell_map) <= visible_count:
+            visible_cells = ((pos, info) for pos, info in self.cell_map.items()
+                             if x0 <= pos[0] <= x1 and y0 <= pos[1] <= y1)
+        else:
+            visible_cells = (((x, y), self.cell_map[(x, y)])
+                             for y in range(y0, y1 + 1) for x in range(x0, x1 + 1)
+                             if (x, y) in self.cell_map)
+
+        for pos, (is_head, player_id, color_info) in visible_cells:
+            x, y = self.world_to_screen(*pos)
+            self.draw_snake_cell(x, y, is_head, player_id == self.player_id, color_info)
+
+        for pos in self.food_cells:
+            if x0 <= pos[0] <= x1 and y0 <= pos[1] <= y1:
+                self.draw_food_cell(*self.world_to_screen(*pos))
+
+        self.screen.set_clip(None)
+
+    def draw_minimap(self):
+        """绘制小地图：按格子写入一张低分辨率表面，再整体缩放一次blit"""
+        scale = min(self.MINIMAP_SIZE / self.world_width, self.MINIMAP_SIZE / self.world_height)
+        display_size = (max(1, int(self.world_width * scale)), max(1, int(self.world_height * scale)))
+
+        if self.minimap_dirty or self.minimap_surface is None:
+            # 每个像素对应一个格子（地图比小地图小时）或若干个格子（大地图）
+            surface_size = (min(self.world_width, display_size[0]), min(self.world_height, display_size[1]))
+            cell_scale_x = surface_size[0] / self.world_width
+            cell_scale_y = surface_size[1] / self.world_height
+
+            surface = pygame.Surface(surface_size)
+            surface.fill((25, 25, 45))
+            for pos in self.food_cells:
+                surface.set_at((int(pos[0] * cell_scale_x), int(pos[1] * cell_scale_y)), Colors.FOOD)
+            for pos, (is_head, player_id, color_info) in self.cell_map.items():
+                color = Colors.TEXT_PRIMARY if (is_head and player_id == self.player_id) else color_info["head"]
+                surface.set_at((int(pos[0] * cell_scale_x), int(pos[1] * cell_scale_y)), color)
+
+            self.minimap_surface = pygame.transform.scale(surface, display_size)
+            self.minimap_dirty = False
+
+        minimap_rect = self.minimap_surface.get_rect()
+        minimap_rect.topright = (self.WINDOW_WIDTH - 20, 20)
+        self.screen.blit(self.minimap_surface, minimap_rect)
+        pygame.draw.rect(self.screen, Colors.GRID_LINE, minimap_rect, 1)
+
+        # 当前镜头范围
+        x0, y0, x1, y1 = self.visible_cell_rect()
+        view_rect = pygame.Rect(minimap_rect.x + int(x0 * scale), minimap_rect.y + int(y0 * scale),
+                                max(2, int((x1 - x0 + 1) * scale)), max(2, int((y1 - y0 + 1) * scale)))
+        pygame.draw.rect(self.screen, Colors.TEXT_PRIMARY, view_rect.clip(minimap_rect), 1)
+
+    def render_leaderboard(self):
+        """收到新排行榜时渲染一次文字，绘制时直接blit"""
+        snakes = self.game_state.get("snakes", {}) if self.game_state else {}
+        self.leaderboard_surfaces = []
+        for i, entry in enumerate(self.leaderboard[:5]):
+            is_me = " (你)" if entry["player_id"] == self.player_id else ""
+            snake_data = snakes.get(entry["player_id"])
+            if snake_data and snake_data["color_index"] < len(self.colors):
+                color = self.colors[snake_data["color_index"]]["head"]
+            else:
+                color = Colors.TEXT_SECONDARY
+            self.leaderboard_surfaces.append(
+                self.font_small.render(f"{i + 1}. {entry['name']}: {entry['score']}{is_me}", True, color)
+            )
 
     def draw_debug_info(self):
         """绘制调试信息"""
@@ -391,10 +810,43 @@ class SnakeClient:
 
         grid_text = self.font_small.render(f"网格大小: {self.GRID_SIZE}px", True, Colors.TEXT_SECONDARY)
         self.screen.blit(grid_text, (info_x, info_y))
-        info_y += line_height * 2
+        info_y += line_height
 
-        # 分数排行榜
-        if self.game_state and "snakes" in self.game_state:
+        # 往返时延、抖动和时钟偏差
+        if self.latency.avg is not None:
+            rtt_text = self.font_small.render(
+                f"延迟: {self.latency.avg:.0f} ms  抖动: {self.latency.jitter:.0f} ms  "
+                f"时钟偏差: {self.latency.offset:+.0f} ms", True, Colors.TEXT_SECONDARY)
+            self.screen.blit(rtt_text, (info_x, info_y))
+        info_y += line_height
+
+        # 输入从发送到在服务器tick中生效的延迟
+        if self.input_latency is not None:
+            latency_text = self.font_small.render(
+                f"输入延迟: {self.input_latency:.0f} ms (平均 {self.input_latency_avg:.0f} ms)",
+                True, Colors.TEXT_SECONDARY)
+            self.screen.blit(latency_text, (info_x, info_y))
+        info_y += line_height
+
+        # 自己当前的得分
+        if self.game_state and self.player_id in self.game_state.get("snakes", {}):
+            my_score = self.game_state["snakes"][self.player_id]["score"]
+            my_score_text = self.font_small.render(f"当前得分: {my_score}", True, Colors.TEXT_PRIMARY)
+            self.screen.blit(my_score_text, (info_x, info_y))
+            info_y += line_height * 2
+
+        # 服务器推送的历史排行榜
+        if self.leaderboard is not None:
+            title_text = self.font_medium.render("分数排行榜", True, Colors.TEXT_PRIMARY)
+            self.screen.blit(title_text, (info_x, info_y))
+            info_y += 35
+
+            for score_text in self.leaderboard_surfaces:
+                self.screen.blit(score_text, (info_x, info_y))
+                info_y += line_height
+
+        # 服务器未开启排行榜时，按当前分数排序
+        elif self.game_state and "snakes" in self.game_state:
             title_text = self.font_medium.render("分数排行榜", True, Colors.TEXT_PRIMARY)
             self.screen.blit(title_text, (info_x, info_y))
             info_y += 35
@@ -424,6 +876,8 @@ class SnakeClient:
             "控制说明:",
             "WASD 或 方向键 - 移动",
             "ESC - 退出游戏",
+            "C - 切换镜头模式",
+            "+/- 或 滚轮 - 镜头缩放",
             "拖拽窗口边缘 - 调整大小"
         ]
 
@@ -501,6 +955,11 @@ class SnakeClient:
                 self.add_debug_info(f"* 窗口大小调整为: {self.WINDOW_WIDTH}x{self.WINDOW_HEIGHT}")
 
             elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_F3:
+                    self.profiler.toggle()
+                elif event.key == pygame.K_F4 and self.profiler.enabled:
+                    self.add_debug_info(f"* 帧追踪已保存到 {self.profiler.dump()}")
+
                 if not self.connected and not self.pending_connection:
                     if event.key == pygame.K_SPACE:
                         # 立即开始连接任务
@@ -522,11 +981,28 @@ class SnakeClient:
 
                     if event.key in direction_map:
                         await self.send_direction(direction_map[event.key])
+                    elif event.key == pygame.K_c:
+                        # 手动切换镜头模式
+                        self.camera_auto = False
+                        self.camera_mode = not self.camera_mode
+                        self.update_game_layout()
+                    elif event.key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS):
+                        self.set_zoom(self.zoom + 2)
+                    elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                        self.set_zoom(self.zoom - 2)
                     elif event.key == pygame.K_ESCAPE:
                         return False
 
+            elif event.type == pygame.MOUSEWHEEL and self.camera_mode:
+                self.set_zoom(self.zoom + 2 * event.y)
+
         return True
 
+    def set_zoom(self, zoom):
+        """设置镜头模式下每格的像素大小"""
+        self.zoom = max(self.MIN_ZOOM, min(self.MAX_ZOOM, zoom))
+        self.update_game_layout()
+
     async def run(self):
         """主游戏循环"""
         running = True
@@ -535,9 +1011,12 @@ class SnakeClient:
         print("* 提示: 可以拖拽窗口边缘来调整大小")
         print("* 调试模式已启用，可以看到详细的连接信息")
 
+        profiler = self.profiler
         while running:
+            profiler.begin_frame()
             # 处理事件
             running = await self.handle_events()
+            profiler.lap("events")
 
             if not running:
                 break
@@ -552,43 +1031,72 @@ class SnakeClient:
                         self.add_debug_info(f"* 连接任务异常: {e}")
                     finally:
                         self.connection_task = None
+                    # 意外断线且会话仍可恢复时自动重连
+                    if not self.connected and self.resume_token and self.disconnected_at is not None:
+                        self.connection_task = asyncio.create_task(self.resume_session())
                 else:
                     # 给异步任务执行的机会
                     await asyncio.sleep(0)
 
+            profiler.lap("tasks")
+
             # 处理网络消息
             self.process_messages()
+            profiler.lap("network")
 
             # 绘制
             self.draw_gradient_background()
+            profiler.lap("background")
 
             if self.connected and self.game_state:
-                self.draw_game_grid()
-                self.draw_snakes()
-                self.draw_foods()
+                if self.camera_mode:
+                    self.draw_camera_view()
+                    profiler.lap("camera_view")
+                    self.draw_minimap()
+                    profiler.lap("minimap")
+                else:
+                    self.draw_game_grid()
+                    profiler.lap("grid")
+                    self.draw_snakes()
+                    profiler.lap("snakes")
+                    self.draw_foods()
+                    profiler.lap("foods")
                 self.draw_ui()
+                profiler.lap("ui")
             else:
                 self.draw_connection_screen()
+                profiler.lap("connection")
 
+            profiler.draw(self.screen, self.profiler_font)
+            profiler.lap("profiler")
             pygame.display.flip()
+            profiler.lap("flip")
             self.clock.tick(60)  # 60 FPS
 
             # 给事件循环机会执行其他任务
             await asyncio.sleep(0.001)  # 1毫秒的休眠，让事件循环调度其他任务
+            profiler.lap("wait")
+            profiler.end_frame()
 
         # 清理
         if self.connection_task and not self.connection_task.done():
             self.add_debug_info("* 取消连接任务")
             self.connection_task.cancel()
+        if self.udp:
+            self.udp.close()
         if self.websocket:
             self.add_debug_info("* 关闭WebSocket连接")
             await self.websocket.close()
         pygame.quit()
 
 
-async def main():
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description="多人贪吃蛇游戏客户端")
+    parser.add_argument("--udp", action="store_true", help="服务器开启UDP时，通过UDP接收状态帧")
+    args = parser.parse_args(argv)
+
     print("* 贪吃蛇Online游戏客户端启动中...")
-    client = SnakeClient()
+    client = SnakeClient(use_udp=args.udp)
     await client.run()
 
 
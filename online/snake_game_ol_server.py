@@ -1,11 +1,33 @@
 import asyncio
+import argparse
+import logging
+import math
+import os
 import websockets
 import json
 import random
+import secrets
+import signal
 import time
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Optional, Set, Tuple
 from enum import Enum
 import uuid
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from online.bots import BotController
+from online.checkpoint import MAX_AGE as CHECKPOINT_MAX_AGE, read_checkpoint, write_checkpoint
+from online.event_log import EventLog, parse_sample_rates
+from online.leaderboard import Leaderboard
+from online.match_recorder import MatchRecorder
+from online.shared_frames import FramePublisher
+from online.spatial_index import SpatialIndex
+from online.spawn import RespawnQueue, SpawnFinder
+from online.tick_policy import TickPolicy
+from online.transport import (MAX_MESSAGE_SIZE, LatencyStats, TokenBucket, UdpChannel, UdpServerProtocol,
+                              WebSocketChannel)
+from online.world_state import MAX_INPUT_SEQ, BodyRing, FoodArray, FrameEncoder
 
 
 class Direction(Enum):
@@ -28,28 +50,30 @@ class PlayerColors:
 class Snake:
     def __init__(self, player_id: str, start_pos: Tuple[int, int], color_index: int):
         self.player_id = player_id
-        self.body = [start_pos, (start_pos[0] - 1, start_pos[1]), (start_pos[0] - 2, start_pos[1])]
+        # 蛇身存放在 int16 环形数组中，见 online/world_state.py
+        self.body = BodyRing([start_pos, (start_pos[0] - 1, start_pos[1]), (start_pos[0] - 2, start_pos[1])])
         self.direction = Direction.RIGHT
         self.grow_pending = False
         self.color_index = color_index
         self.alive = True
         self.score = 0
 
-    def move(self):
+    def move(self) -> Optional[Tuple[int, int]]:
+        """向前移动一格，返回离开的尾部格子（生长时返回 None）"""
         if not self.alive:
-            return
+            return None
 
         head = self.body[0]
         new_head = (
             head[0] + self.direction.value[0],
             head[1] + self.direction.value[1]
         )
-        self.body.insert(0, new_head)
+        self.body.push_head(new_head)
 
         if not self.grow_pending:
-            self.body.pop()
-        else:
-            self.grow_pending = False
+            return self.body.pop_tail()
+        self.grow_pending = False
+        return None
 
     def change_direction(self, new_direction: Direction):
         if not self.alive:
@@ -92,177 +116,684 @@ class Snake:
         return head in other_snake.body
 
 
-class Food:
-    def __init__(self, position: Tuple[int, int]):
-        self.position = position
-
-
 class GameServer:
-    def __init__(self):
-        self.GRID_WIDTH = 50  # 扩大游戏区域
-        self.GRID_HEIGHT = 35
-        self.MAX_PLAYERS = 5
-        self.GAME_SPEED = 10  # 游戏更新频率 (FPS)
+    def __init__(self, grid_width: int = 50, grid_height: int = 35, max_players: int = 5,
+                 food_count: int = 8, view_radius: Optional[int] = None, bot_count: int = 0,
+                 leaderboard: Optional[Leaderboard] = None, event_log: Optional[EventLog] = None,
+                 resume_grace: float = 15.0, seed: Optional[int] = None,
+                 tick_policy: Optional[TickPolicy] = None, idle_timeout: float = 60.0,
+                 respawn_delay: float = 0.0, tick_executor: Optional[Executor] = None):
+        self.GRID_WIDTH = grid_width  # 扩大游戏区域
+        self.GRID_HEIGHT = grid_height
+        self.MAX_PLAYERS = max_players
+        self.FOOD_COUNT = food_count
+        # 基础游戏更新频率 (FPS)，实际频率由策略按房间人数和主机负载调整
+        self.tick_policy = tick_policy or TickPolicy()
+        self.GAME_SPEED = self.tick_policy.base_rate
+        self.tick_rate = self.tick_policy.rate
+        # 所有玩家超过 IDLE_TIMEOUT 秒没有输入时暂停tick，直到下一次输入（为 0 时不暂停）
+        self.IDLE_TIMEOUT = idle_timeout
+        self.last_input_time = time.time()
+        self.idle = False
+        self.idle_since = 0.0
+        self.wake = asyncio.Event()  # 有输入、加入或断线时唤醒暂停中的循环
+        # 可选：在线程池中执行 update_game，多个房间的tick互相重叠，事件循环只处理网络I/O。
+        # tick执行期间房间状态归工作线程所有：事件循环上修改状态的协程先 await state_ready()，
+        # 同步回调（输入、断线超时、排行榜）放进 after_tick，等状态交还后再执行
+        self.tick_executor = tick_executor
+        self.ticking = False
+        self.tick_done = asyncio.Event()
+        self.after_tick: List[Callable[[], None]] = []
+        # 视野半径（格子数）。为 None 时每个玩家都收到完整地图；
+        # 设置后只同步玩家蛇头周围的实体，适用于大地图
+        self.VIEW_RADIUS = view_radius
+        # 房间里保持的蛇的数量，真人玩家不足时用机器人补齐
+        self.BOT_COUNT = bot_count
+        self.BOT_BUDGET = 0.3  # 机器人决策最多占用一个tick时长的比例
+        # 服务器自己的随机数生成器（食物、重生位置），状态随检查点保存，重启后继续同一序列
+        self.rng = random.Random(seed)
 
         self.players: Dict[str, websockets.WebSocketServerProtocol] = {}
         self.snakes: Dict[str, Snake] = {}
-        self.foods: List[Food] = []
+        self.used_colors: Set[int] = set()  # 房间里的蛇正在使用的颜色编号
+        self.foods = FoodArray()
         self.game_running = False
-        self.last_update = time.time()
+
+        # 空间索引：活着的蛇身占用的格子，以及食物位置
+        self.snake_index = SpatialIndex()
+        self.food_index = SpatialIndex()
+        # 出生点：根据蛇的占用情况维护空区块集合；死亡的蛇按到期tick进入重生队列
+        self.spawn_finder = SpawnFinder(self.GRID_WIDTH, self.GRID_HEIGHT, self.snake_index, rng=self.rng)
+        self.respawn_queue = RespawnQueue()
+        self.RESPAWN_DELAY = respawn_delay  # 死亡后等待多少秒重生
+        # 每个玩家上一帧能看到的蛇，用于生成进入/离开视野事件
+        self.visible_snakes: Dict[str, Set[str]] = {}
+
+        # 机器人玩家：和真人玩家一样拥有蛇，但没有websocket连接
+        self.bot_controller = BotController()
+
+        # 持久化排行榜（可选），前K名变化时才推送给玩家
+        self.leaderboard = leaderboard
+        self.sent_leaderboard_version = -1
+
+        # 结构化事件日志：tick中只入队，由后台线程写出（未启动时不输出）
+        self.events = event_log if event_log is not None else EventLog()
+
+        # 状态帧通道：默认走websocket，客户端完成UDP握手后切换为UDP
+        self.channels: Dict[str, object] = {}
+        self.udp_endpoint: Optional[UdpServerProtocol] = None
+        self.udp_port: Optional[int] = None
+        self.udp_tokens: Dict[str, str] = {}  # UDP令牌 -> 玩家ID
+        self.last_input_seq: Dict[str, int] = {}  # 每个玩家已处理的最大输入序号，用于去重
+        self.frame_seq = 0  # 状态帧序号，客户端据此丢弃乱序到达的旧帧
+        # 连接时带 binary=1 的玩家接收二进制状态帧（仅完整地图模式，视野模式仍为JSON）
+        self.binary_players: Set[str] = set()
+        self.frame_encoder = FrameEncoder()
+        # 可选：每个tick把完整状态帧发布到共享内存，供同机的其他进程读取
+        self.frame_publisher: Optional[FramePublisher] = None
+        # 可选：把每个tick的完整状态录制到文件，用于离线回放渲染
+        self.recorder: Optional[MatchRecorder] = None
+
+        # 输入缓冲：每个玩家的方向输入先排队，每个tick只消费一条，
+        # 同一tick内的两次快速转向不会互相覆盖；消费后的序号作为确认(ack)随帧下发
+        self.INPUT_BUFFER = 3
+        self.input_queues: Dict[str, deque] = {}
+        self.acked_seq: Dict[str, int] = {}
+        self.tick = 0
+
+        # 每个连接的往返时延统计，由客户端在 ping 中上报自己测得的RTT
+        self.rtt_stats: Dict[str, LatencyStats] = {}
+        self.METRICS_INTERVAL = 10.0
+        self.last_metrics = time.time()
+
+        # 输入限流：每个连接一个令牌桶，超限的消息在JSON解析前丢弃，持续刷屏的连接被断开
+        self.input_limits: Dict[str, TokenBucket] = {}
+        self.input_counters = {"accepted": 0, "oversized": 0, "rate_limited": 0, "invalid": 0, "kicked": 0}
+
+        # 断线恢复：连接断开后蛇原地冻结保留 RESUME_GRACE 秒，
+        # 客户端带着 welcome 中的恢复令牌重连即可继续游戏（为 0 时断线立即移除）
+        self.RESUME_GRACE = resume_grace
+        self.resume_tokens: Dict[str, str] = {}  # 恢复令牌 -> 玩家ID
+        self.suspended: Dict[str, Tuple[asyncio.TimerHandle, int]] = {}  # 玩家ID -> (过期定时器, 断线时的tick)
+        # 已断开、等待本tick清理阶段处理的连接：玩家ID -> websocket
+        self.pending_disconnects: Dict[str, object] = {}
 
         # 生成初始食物
-        self.generate_foods(8)  # 增加食物数量
+        self.generate_foods(self.FOOD_COUNT)
 
     def generate_start_positions(self) -> List[Tuple[int, int]]:
-        """为玩家生成不重叠的起始位置"""
+        """为玩家生成不重叠的起始位置（按地图大小等比例分布）"""
+        w, h = self.GRID_WIDTH, self.GRID_HEIGHT
         positions = [
-            (10, 10),  # 左上
-            (40, 10),  # 右上
-            (10, 25),  # 左下
-            (40, 25),  # 右下
-            (25, 17),  # 中心
+            (w // 5, h * 2 // 7),  # 左上
+            (w * 4 // 5, h * 2 // 7),  # 右上
+            (w // 5, h * 5 // 7),  # 左下
+            (w * 4 // 5, h * 5 // 7),  # 右下
+            (w // 2, h // 2),  # 中心
         ]
         return positions
 
+    def spawn_position(self, color_index: int) -> Optional[Tuple[int, int]]:
+        """出生位置：前几种颜色优先使用固定的起始位置，不安全时由出生点查找器另找；找不到时返回 None"""
+        start_positions = self.generate_start_positions()
+        preferred = start_positions[color_index] if color_index < len(start_positions) else None
+        return self.spawn_finder.find(preferred)
+
     def generate_foods(self, count: int):
         """生成食物，避免与蛇身重叠"""
-        occupied_positions = set()
-        for snake in self.snakes.values():
-            occupied_positions.update(snake.body)
-
-        for food in self.foods:
-            occupied_positions.add(food.position)
-
         while len(self.foods) < count:
-            pos = (random.randint(0, self.GRID_WIDTH - 1),
-                   random.randint(0, self.GRID_HEIGHT - 1))
-            if pos not in occupied_positions:
-                self.foods.append(Food(pos))
-                occupied_positions.add(pos)
+            pos = (self.rng.randint(0, self.GRID_WIDTH - 1),
+                   self.rng.randint(0, self.GRID_HEIGHT - 1))
+            if pos not in self.foods and self.snake_index.is_free(pos):
+                self.foods.add(pos)
+                self.food_index.add(pos, pos)
+
+    def index_snake(self, player_id: str, snake: Snake):
+        for segment in snake.body:
+            self.snake_index.add(player_id, segment)
+
+    def unindex_snake(self, player_id: str, snake: Snake):
+        for segment in snake.body:
+            self.snake_index.remove(player_id, segment)
+
+    def create_snake(self, player_id: str) -> Snake:
+        """为玩家（或机器人）创建蛇并放到地图上"""
+        color_index = self.allocate_color()
+        start_pos = self.spawn_position(color_index)
+
+        snake = Snake(player_id, start_pos or (2, 0), color_index)
+        self.snakes[player_id] = snake
+        if start_pos is None:
+            # 地图太拥挤，先以死亡状态加入，等有空位时重生
+            snake.alive = False
+            self.respawn_queue.schedule(player_id, self.tick + 1)
+        else:
+            self.index_snake(player_id, snake)
+        return snake
+
+    def allocate_color(self) -> int:
+        """分配最小的未被使用的颜色编号，离开的蛇的颜色可以被新蛇复用"""
+        color_index = 0
+        while color_index in self.used_colors:
+            color_index += 1
+        self.used_colors.add(color_index)
+        return color_index
+
+    def remove_snake(self, player_id: str):
+        self.frame_encoder.forget(player_id)
+        if player_id in self.snakes:
+            snake = self.snakes.pop(player_id)
+            self.used_colors.discard(snake.color_index)
+            if snake.alive:
+                self.unindex_snake(player_id, snake)
+
+    def add_bot(self) -> str:
+        player_id = f"bot-{uuid.uuid4().hex[:8]}"
+        self.create_snake(player_id)
+        self.bot_controller.add(player_id)
+        return player_id
+
+    def remove_bot(self, player_id: str):
+        self.bot_controller.remove(player_id)
+        self.remove_snake(player_id)
+
+    def balance_bots(self):
+        """用机器人把房间补到 BOT_COUNT 条蛇，真人玩家加入时让出位置"""
+        bot_ids = self.bot_controller.bot_ids
+        target = max(0, min(self.BOT_COUNT, self.MAX_PLAYERS) - len(self.players) - len(self.suspended))
+        while len(bot_ids) > target:
+            self.remove_bot(bot_ids[-1])
+        while len(bot_ids) < target:
+            self.add_bot()
+
+    def update_bots(self):
+        """计算并应用机器人的方向，耗时不超过预算"""
+        budget = self.BOT_BUDGET / self.tick_rate
+        for player_id, direction in self.bot_controller.update(self, budget):
+            self.snakes[player_id].change_direction(Direction[direction])
+
+    async def start_udp(self, host: str, port: int):
+        """开启UDP状态帧通道"""
+        loop = asyncio.get_running_loop()
+        _, self.udp_endpoint = await loop.create_datagram_endpoint(
+            lambda: UdpServerProtocol(self.handle_datagram), local_addr=(host, port))
+        self.udp_port = port
+
+    def handle_datagram(self, message: dict, addr):
+        """处理UDP数据报：握手或方向输入，必须携带欢迎消息中下发的令牌"""
+        player_id = self.udp_tokens.get(message.get("token"))
+        if player_id is None or player_id not in self.players:
+            return
+        if not self.input_limits[player_id].allow():
+            self.input_counters["rate_limited"] += 1
+            return
+
+        if message.get("type") == "udp_hello":
+            if not isinstance(self.channels.get(player_id), UdpChannel):
+                self.events.emit("udp_ready", player_id=player_id)
+            self.channels[player_id] = UdpChannel(self.udp_endpoint, addr, WebSocketChannel(self.players[player_id]),
+                                                  lambda size: self.udp_oversized(player_id, size))
+
+        elif message.get("type") == "input":
+            channel = self.channels.get(player_id)
+            if isinstance(channel, UdpChannel):
+                channel.addr = addr  # 客户端地址可能因NAT重新映射而变化
+            inputs = message.get("inputs")
+            if isinstance(inputs, list):
+                # 数据报里带有最近几次输入（可能重复），按序号从旧到新应用，已处理过的会被跳过
+                for entry in sorted(item for item in inputs if isinstance(item, list) and len(item) == 2
+                                    and isinstance(item[0], int)):
+                    self.apply_input(player_id, entry[1], entry[0])
+
+    def udp_oversized(self, player_id: str, size: int):
+        """状态帧超过UDP数据报上限，已改走websocket；每个UDP通道只记录第一次"""
+        channel = self.channels.get(player_id)
+        if isinstance(channel, UdpChannel) and channel.oversized == 1:
+            self.events.emit("udp_oversized", logging.WARNING, player_id=player_id, size=size)
+
+    def apply_input(self, player_id: str, direction: str, seq: Optional[int] = None):
+        """把一次方向输入放进该玩家的输入队列；带序号的输入只处理一次"""
+        if self.ticking:
+            self.after_tick.append(lambda: self.apply_input(player_id, direction, seq))
+            return
+        if not isinstance(direction, str) or direction not in Direction.__members__ or player_id not in self.snakes:
+            return
+        if seq is not None:
+            # 序号随二进制帧以 u32 下发确认，超出范围的直接丢弃
+            if not 0 <= seq <= MAX_INPUT_SEQ or seq <= self.last_input_seq.get(player_id, -1):
+                return
+            self.last_input_seq[player_id] = seq
+
+        queue = self.input_queues.setdefault(player_id, deque())
+        # 队列满时丢弃新的输入（正常操作一个tick内不会超过缓冲长度）
+        if len(queue) < self.INPUT_BUFFER:
+            queue.append((seq, Direction[direction]))
+        self.touch()
+
+    def touch(self):
+        """记录一次玩家活动，房间暂停中时唤醒"""
+        self.last_input_time = time.time()
+        self.wake.set()
+
+    def consume_inputs(self):
+        """每条蛇消费一条输入；不会改变方向的输入（同向或反向）直接跳过，不占用这个tick"""
+        for player_id, queue in self.input_queues.items():
+            snake = self.snakes.get(player_id)
+            while queue:
+                seq, direction = queue.popleft()
+                if seq is not None:
+                    self.acked_seq[player_id] = seq
+                if snake is None or not snake.alive:
+                    continue
+                previous = snake.direction
+                snake.change_direction(direction)
+                if snake.direction != previous:
+                    break
 
     async def register_player(self, websocket):
-        """注册新玩家"""
-        if len(self.players) >= self.MAX_PLAYERS:
-            await websocket.send(json.dumps({
-                "type": "error",
-                "message": "游戏房间已满，最多支持5人同时游戏"
-            }))
-            await websocket.close()
+        """注册新玩家；连接地址带有效的 resume 参数时恢复断线前的会话"""
+        await self.state_ready()
+        params = self.query_params(websocket)
+        player_id = self.resume_tokens.pop(params.get("resume"), None)
+        if player_id is not None and player_id in self.snakes:
+            self.set_frame_format(player_id, params)
+            await self.resume_player(player_id, websocket)
+            await self.serve_player(player_id, websocket)
             return
 
+        player_id = self.add_player(websocket, params)
+        if player_id is None:
+            await self.reject_full(websocket)
+            return
+        await self.start_player(player_id, websocket)
+
+    def add_player(self, websocket, params: Dict[str, str]) -> Optional[str]:
+        """把新玩家加入房间并创建蛇，房间已满时返回 None
+
+        中间没有 await，调用方（例如大厅）可以确定返回时玩家已经在 players 中；
+        必须在房间状态可用时调用（没有tick在工作线程中执行）
+        """
+        if len(self.players) + len(self.suspended) >= self.MAX_PLAYERS:
+            return None
+
         player_id = str(uuid.uuid4())
         self.players[player_id] = websocket
+        self.channels[player_id] = WebSocketChannel(websocket)
+        self.rtt_stats[player_id] = LatencyStats()
+        self.input_limits[player_id] = TokenBucket()
+        self.set_frame_format(player_id, params)
 
-        # 创建蛇
-        start_positions = self.generate_start_positions()
-        color_index = len(self.snakes)
-        start_pos = start_positions[color_index] if color_index < len(start_positions) else (25, 17)
-
-        snake = Snake(player_id, start_pos, color_index)
-        self.snakes[player_id] = snake
+        # 先让机器人让出位置，再创建蛇
+        self.balance_bots()
+        self.create_snake(player_id)
 
-        print(f"玩家 {player_id[:8]} 加入游戏，当前玩家数: {len(self.players)}")
+        self.events.emit("join", player_id=player_id, players=len(self.players))
+        return player_id
 
-        # 发送欢迎消息
+    async def reject_full(self, websocket):
         await websocket.send(json.dumps({
-            "type": "welcome",
-            "player_id": player_id,
-            "color": PlayerColors.COLORS[color_index],
-            "message": f"欢迎加入游戏！你是{PlayerColors.COLORS[color_index]['name']}蛇"
+            "type": "error",
+            "message": f"游戏房间已满，最多支持{self.MAX_PLAYERS}人同时游戏"
         }))
+        await websocket.close()
+
+    async def start_player(self, player_id: str, websocket):
+        """新玩家加入后：发送欢迎消息，启动游戏循环，然后处理该连接上的消息"""
+        snake = self.snakes[player_id]
+
+        # 发送欢迎消息
+        color = PlayerColors.COLORS[snake.color_index % len(PlayerColors.COLORS)]
+        await websocket.send(json.dumps(self.welcome_message(player_id, f"欢迎加入游戏！你是{color['name']}蛇")))
+
+        # 新玩家立即收到当前排行榜
+        if self.leaderboard:
+            await websocket.send(self.leaderboard_message())
 
         # 开始游戏循环（如果还没开始）
+        self.touch()
         if not self.game_running:
             self.game_running = True
             asyncio.create_task(self.game_loop())
 
         # 广播玩家加入消息
         await self.broadcast_game_state()
+        await self.serve_player(player_id, websocket)
 
+    async def serve_player(self, player_id: str, websocket):
+        """处理一个连接上的消息，连接断开后进入断线保留"""
         try:
             async for message in websocket:
                 await self.handle_message(player_id, message)
         except websockets.exceptions.ConnectionClosed:
             pass
         finally:
-            await self.unregister_player(player_id)
+            self.pending_disconnects[player_id] = websocket
+            self.wake.set()
+
+    @staticmethod
+    def query_params(websocket) -> Dict[str, str]:
+        """连接地址中的查询参数，例如 ws://host:8765/?resume=TOKEN&binary=1"""
+        request = getattr(websocket, "request", None)
+        if request is None:
+            return {}
+        return {key: values[0] for key, values in parse_qs(urlsplit(request.path).query).items()}
+
+    def set_frame_format(self, player_id: str, params: Dict[str, str]):
+        if params.get("binary") == "1":
+            self.binary_players.add(player_id)
+        else:
+            self.binary_players.discard(player_id)
+
+    def welcome_message(self, player_id: str, text: str) -> dict:
+        """欢迎消息，每次都签发新的恢复令牌（旧令牌作废）"""
+        for token in [token for token, owner in self.resume_tokens.items() if owner == player_id]:
+            del self.resume_tokens[token]
+        snake = self.snakes[player_id]
+        welcome = {
+            "type": "welcome",
+            "player_id": player_id,
+            "color": PlayerColors.COLORS[snake.color_index % len(PlayerColors.COLORS)],
+            "colors": PlayerColors.COLORS,
+            "message": text
+        }
+        if self.RESUME_GRACE > 0:
+            token = secrets.token_urlsafe(16)
+            self.resume_tokens[token] = player_id
+            welcome["resume"] = {"token": token, "grace": self.RESUME_GRACE}
+        if self.udp_endpoint is not None:
+            token = secrets.token_hex(8)
+            self.udp_tokens[token] = player_id
+            welcome["udp"] = {"port": self.udp_port, "token": token}
+        return welcome
+
+    async def resume_player(self, player_id: str, websocket):
+        """恢复断线前的会话：沿用原来的蛇、颜色和分数，只发一帧快照补上断线期间的变化"""
+        previous = self.players.get(player_id)
+        if player_id in self.suspended:
+            handle, suspended_tick = self.suspended.pop(player_id)
+            handle.cancel()
+        else:
+            # 旧连接还没被发现断开（半开连接），直接由新连接接管
+            suspended_tick = self.tick
+        self.players[player_id] = websocket
+        self.channels[player_id] = WebSocketChannel(websocket)
+        self.rtt_stats.setdefault(player_id, LatencyStats())
+        self.input_limits.setdefault(player_id, TokenBucket())
+        self.visible_snakes.pop(player_id, None)
+        for token in [token for token, owner in self.udp_tokens.items() if owner == player_id]:
+            del self.udp_tokens[token]
+        if previous is not None and previous is not websocket:
+            await previous.close()
+
+        missed = self.tick - suspended_tick
+        self.events.emit("resume", player_id=player_id, missed_ticks=missed)
+
+        welcome = self.welcome_message(player_id, "已恢复断线前的游戏")
+        welcome["resumed"] = True
+        welcome["missed_ticks"] = missed
+        await websocket.send(json.dumps(welcome))
+        if self.leaderboard:
+            await websocket.send(self.leaderboard_message())
+
+        self.touch()
+        if not self.game_running:
+            self.game_running = True
+            asyncio.create_task(self.game_loop())
+
+        # 只发给该玩家的完整快照，之后正常接收每个tick的状态帧
+        await self.state_ready()
+        if self.VIEW_RADIUS is None and player_id in self.binary_players:
+            await websocket.send(self.encode_game_state())
+            return
+        if self.VIEW_RADIUS is None:
+            snapshot = self.build_game_state()
+        else:
+            snapshot = self.build_view_state(player_id)
+        await websocket.send(json.dumps(snapshot))
+
+    def process_disconnects(self):
+        """每个tick统一处理一次断开的连接，成员变化随下一帧状态一起下发"""
+        pending, self.pending_disconnects = self.pending_disconnects, {}
+        for player_id, websocket in pending.items():
+            self.disconnect_player(player_id, websocket)
+
+    def disconnect_player(self, player_id: str, websocket):
+        """连接断开：保留会话等待重连，超时后再注销"""
+        if websocket is None or self.players.get(player_id) is not websocket:
+            return  # 已经被新连接接管或已经处理过
+        if self.RESUME_GRACE <= 0 or player_id not in self.snakes:
+            self.unregister_player(player_id)
+            return
+
+        del self.players[player_id]
+        self.channels.pop(player_id, None)
+        self.input_queues.pop(player_id, None)
+        self.visible_snakes.pop(player_id, None)
+        for token in [token for token, owner in self.udp_tokens.items() if owner == player_id]:
+            del self.udp_tokens[token]
+
+        handle = asyncio.get_running_loop().call_later(self.RESUME_GRACE, self.expire_session, player_id)
+        self.suspended[player_id] = (handle, self.tick)
+        self.events.emit("suspend", player_id=player_id, grace=self.RESUME_GRACE)
+
+    def expire_session(self, player_id: str):
+        """断线保留超时，彻底移除玩家"""
+        if self.ticking:
+            self.after_tick.append(lambda: self.expire_session(player_id))
+            return
+        if self.suspended.pop(player_id, None) is not None:
+            self.unregister_player(player_id)
 
-    async def unregister_player(self, player_id: str):
+    def unregister_player(self, player_id: str):
         """注销玩家"""
         if player_id in self.players:
             del self.players[player_id]
-        if player_id in self.snakes:
-            del self.snakes[player_id]
-
-        print(f"玩家 {player_id[:8]} 离开游戏，当前玩家数: {len(self.players)}")
-
-        # 如果没有玩家了，停止游戏循环
-        if len(self.players) == 0:
-            self.game_running = False
-
-        # 广播更新
-        await self.broadcast_game_state()
+        self.remove_snake(player_id)
+        self.visible_snakes.pop(player_id, None)
+        self.channels.pop(player_id, None)
+        self.last_input_seq.pop(player_id, None)
+        self.input_queues.pop(player_id, None)
+        self.acked_seq.pop(player_id, None)
+        self.binary_players.discard(player_id)
+        for token in [token for token, owner in self.udp_tokens.items() if owner == player_id]:
+            del self.udp_tokens[token]
+        for token in [token for token, owner in self.resume_tokens.items() if owner == player_id]:
+            del self.resume_tokens[token]
+        handle, _ = self.suspended.pop(player_id, (None, 0))
+        if handle is not None:
+            handle.cancel()
+        self.balance_bots()
+
+        stats = self.rtt_stats.pop(player_id, None)
+        limit = self.input_limits.pop(player_id, None)
+        self.events.emit("leave", player_id=player_id, players=len(self.players),
+                         dropped_messages=limit.dropped if limit else 0, **(stats.summary() if stats else {}))
+
+    async def handle_message(self, player_id: str, message):
+        """处理玩家消息：先做限流、类型和长度检查，通过后才解析JSON"""
+        # 每条消息（包括随后被拒绝的超长消息和二进制消息）都消耗令牌，持续刷屏的连接会被断开
+        limit = self.input_limits.get(player_id)
+        if limit is not None and not limit.allow():
+            self.input_counters["rate_limited"] += 1
+            if limit.flooding():
+                await self.kick_player(player_id, "消息过于频繁")
+            return
+        if not isinstance(message, str):
+            self.input_counters["invalid"] += 1
+            return
+        if len(message) > MAX_MESSAGE_SIZE:
+            self.input_counters["oversized"] += 1
+            return
 
-    async def handle_message(self, player_id: str, message: str):
-        """处理玩家消息"""
         try:
             data = json.loads(message)
-
-            if data["type"] == "direction":
-                direction_map = {
-                    "UP": Direction.UP,
-                    "DOWN": Direction.DOWN,
-                    "LEFT": Direction.LEFT,
-                    "RIGHT": Direction.RIGHT
-                }
-
-                if data["direction"] in direction_map and player_id in self.snakes:
-                    self.snakes[player_id].change_direction(direction_map[data["direction"]])
-
         except json.JSONDecodeError:
-            print(f"收到无效消息: {message}")
+            data = None
+        if not isinstance(data, dict):
+            self.input_counters["invalid"] += 1
+            self.events.emit("invalid_message", logging.WARNING, player_id=player_id, size=len(message))
+            return
+        self.input_counters["accepted"] += 1
+
+        message_type = data.get("type")
+        if message_type == "direction":
+            seq = data.get("seq")
+            self.apply_input(player_id, data.get("direction"), seq if isinstance(seq, int) else None)
+
+        elif message_type == "ping":
+            # 立即回复，带上服务器时间供客户端估计时钟偏差
+            websocket = self.players.get(player_id)
+            if websocket is not None:
+                await websocket.send(json.dumps({"type": "pong", "t": data.get("t"), "server_time": time.time()}))
+            rtt = data.get("rtt")
+            if isinstance(rtt, (int, float)) and 0 <= rtt < 60000 and player_id in self.rtt_stats:
+                stats = self.rtt_stats[player_id]
+                stats.add(rtt)
+                self.events.emit("rtt", logging.DEBUG, player_id=player_id, **stats.summary())
+
+    async def kick_player(self, player_id: str, reason: str):
+        """断开恶意连接，不保留会话"""
+        await self.state_ready()
+        websocket = self.players.get(player_id)
+        self.input_counters["kicked"] += 1
+        self.events.emit("kick", logging.WARNING, player_id=player_id, reason=reason)
+        self.unregister_player(player_id)
+        if websocket is not None:
+            await websocket.close(1008, "flood")
 
     async def game_loop(self):
-        """主游戏循环"""
-        while self.game_running and len(self.players) > 0:
-            current_time = time.time()
-            if current_time - self.last_update >= 1.0 / self.GAME_SPEED:
-                self.update_game()
-                await self.broadcast_game_state()
-                self.last_update = current_time
+        """主游戏循环：两个tick之间直接睡到下一个tick，房间空闲时暂停到下一次输入"""
+        next_tick = time.time()
+        try:
+            while self.game_running and len(self.players) > 0:
+                current_time = time.time()
+                if self.IDLE_TIMEOUT > 0 and current_time - self.last_input_time > self.IDLE_TIMEOUT:
+                    self.process_disconnects()
+                    if not self.players:
+                        break
+                    if not self.idle:
+                        self.idle, self.idle_since = True, current_time
+                        self.events.emit("room_idle", players=len(self.players), idle_seconds=self.IDLE_TIMEOUT)
+                    await self.wait_for_activity()
+                    next_tick = time.time()
+                    continue
+                if self.idle:
+                    self.idle = False
+                    self.events.emit("room_resume", players=len(self.players),
+                                     paused=round(current_time - self.idle_since, 1))
+                if current_time < next_tick:
+                    await asyncio.sleep(next_tick - current_time)
+                    continue
+
+                self.process_disconnects()
+                if not self.players:
+                    break
+                try:
+                    # 负载只统计tick本身的计算时间，不含在线程池中排队和发送状态帧的等待
+                    self.tick_policy.host_load.add_busy(await self.run_tick())
+                    await self.broadcast_game_state()
+                    self.publish_frame()
+                    if self.recorder:
+                        self.recorder.record(self.build_game_state())
+                    await self.broadcast_leaderboard()
+                except Exception as e:
+                    # 单个tick出错只记录，不让整个房间停止
+                    self.events.emit("tick_error", logging.ERROR, error=f"{type(e).__name__}: {e}")
+
+                # 按人数和负载调整下一个tick的频率；落后太多时不补tick，从现在重新计时
+                rate = self.tick_policy.next_rate(len(self.players))
+                if round(rate) != round(self.tick_rate):
+                    self.events.emit("tick_rate", rate=round(rate, 1), players=len(self.players))
+                self.tick_rate = rate
+                next_tick = max(next_tick + 1.0 / rate, current_time)
+
+                # 定期把各连接的时延统计写进事件日志
+                if current_time - self.last_metrics >= self.METRICS_INTERVAL:
+                    self.events.emit("latency", connections=self.latency_metrics())
+                    self.events.emit("input_stats", **self.input_counters)
+                    self.last_metrics = current_time
 
-            await asyncio.sleep(0.01)  # 避免CPU占用过高
+        finally:
+            # 只剩断线保留中的玩家时循环退出，恢复连接后会重新启动；
+            # 循环意外退出时同样复位，下一个加入或恢复的玩家会重新启动循环
+            self.game_running = False
+            self.idle = False
+
+    def timed_update(self) -> float:
+        """执行 update_game，返回实际的计算耗时（秒）"""
+        started = time.perf_counter()
+        self.update_game()
+        return time.perf_counter() - started
+
+    async def run_tick(self) -> float:
+        """执行一个tick，返回计算耗时；配置了线程池时把房间状态交给工作线程，结束后再交还给事件循环"""
+        if self.tick_executor is None:
+            return self.timed_update()
+        self.ticking = True
+        self.tick_done.clear()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.tick_executor, self.timed_update)
+        finally:
+            self.ticking = False
+            self.tick_done.set()
+            deferred, self.after_tick = self.after_tick, []
+            for callback in deferred:
+                callback()
+
+    async def state_ready(self):
+        """等待工作线程中的tick交还房间状态（没有tick在执行时立即返回）"""
+        while self.ticking:
+            await self.tick_done.wait()
+
+    async def wait_for_activity(self):
+        """房间空闲时停止tick，直到有玩家输入、加入或断开"""
+        while self.game_running and self.players and not self.pending_disconnects:
+            self.wake.clear()
+            if time.time() - self.last_input_time <= self.IDLE_TIMEOUT:
+                return
+            await self.wake.wait()
 
     def update_game(self):
         """更新游戏状态"""
-        # 移动所有活着的蛇
-        for snake in self.snakes.values():
-            if snake.alive:
-                snake.move()
+        self.tick += 1
+
+        # 机器人根据上一帧的局面决定方向，玩家消费各自输入队列中的一条输入
+        self.update_bots()
+        self.consume_inputs()
 
-        # 检查碰撞
+        # 移动所有活着的蛇，同时增量更新空间索引（加入新蛇头，移除旧蛇尾）；
+        # 断线保留中的蛇原地冻结
         for player_id, snake in self.snakes.items():
-            if not snake.alive:
+            if snake.alive and player_id not in self.suspended:
+                tail = snake.move()
+                if tail is not None:
+                    self.snake_index.remove(player_id, tail)
+                self.snake_index.add(player_id, snake.body[0])
+
+        # 检查碰撞（先全部判定再统一处理死亡，迎面相撞时双方都会死亡）
+        dead_players = []
+        for player_id, snake in self.snakes.items():
+            if not snake.alive or player_id in self.suspended:
                 continue
 
             # 检查墙壁碰撞
             if snake.check_wall_collision(self.GRID_WIDTH, self.GRID_HEIGHT):
-                snake.alive = False
-                print(f"玩家 {player_id[:8]} 撞墙死亡")
+                dead_players.append(player_id)
+                self.events.emit("death", player_id=player_id, cause="wall", score=snake.score)
                 continue
 
-            # 检查自身碰撞
-            if snake.check_self_collision():
-                snake.alive = False
-                print(f"玩家 {player_id[:8]} 撞到自己死亡")
-                continue
+            # 蛇头所在格子除了蛇头本身还有其他占用，说明撞到了蛇身
+            head = snake.body[0]
+            if self.snake_index.count(head) > 1:
+                dead_players.append(player_id)
+                cause = "self" if self.snake_index.cells[head].get(player_id, 0) > 1 else "snake"
+                self.events.emit("death", player_id=player_id, cause=cause, score=snake.score)
 
-            # 检查与其他蛇的碰撞
-            for other_id, other_snake in self.snakes.items():
-                if other_id != player_id and snake.check_snake_collision(other_snake):
-                    snake.alive = False
-                    print(f"玩家 {player_id[:8]} 撞到其他蛇死亡")
-                    break
+        for player_id in dead_players:
+            snake = self.snakes[player_id]
+            snake.alive = False
+            self.unindex_snake(player_id, snake)
+            self.schedule_respawn(player_id)
 
         # 检查食物碰撞
         for snake in self.snakes.values():
@@ -270,91 +801,449 @@ class GameServer:
                 continue
 
             head = snake.body[0]
-            for food in self.foods[:]:  # 使用切片避免修改列表时出错
-                if head == food.position:
-                    snake.grow()
-                    self.foods.remove(food)
-                    print(f"玩家 {snake.player_id[:8]} 吃到食物，得分: {snake.score}")
-                    break
+            if head in self.foods:
+                snake.grow()
+                self.foods.remove(head)
+                self.food_index.remove(head, head)
+                self.record_score(snake)
+                self.events.emit("food", logging.DEBUG, player_id=snake.player_id, score=snake.score)
 
         # 保持食物数量
-        self.generate_foods(8)
+        self.generate_foods(self.FOOD_COUNT)
 
         # 检查是否需要重置死亡的蛇
         self.respawn_dead_snakes()
 
-    def respawn_dead_snakes(self):
-        """重生死亡的蛇（5秒后）"""
-        start_positions = self.generate_start_positions()
-
-        for player_id, snake in self.snakes.items():
-            if not snake.alive:
-                # 简单重生逻辑：立即重生到起始位置
-                color_index = snake.color_index
-                start_pos = start_positions[color_index] if color_index < len(start_positions) else (25, 17)
-
-                # 检查起始位置是否安全
-                occupied = False
-                for other_snake in self.snakes.values():
-                    if other_snake.alive and start_pos in other_snake.body:
-                        occupied = True
-                        break
+    def schedule_respawn(self, player_id: str):
+        delay_ticks = math.ceil(self.RESPAWN_DELAY * self.tick_rate)
+        self.respawn_queue.schedule(player_id, self.tick + delay_ticks)
 
-                if not occupied:
-                    snake.body = [start_pos, (start_pos[0] - 1, start_pos[1]), (start_pos[0] - 2, start_pos[1])]
-                    snake.direction = Direction.RIGHT
-                    snake.alive = True
-                    snake.score = 0
-                    print(f"玩家 {player_id[:8]} 重生")
+    def respawn_dead_snakes(self):
+        """重生到期的死亡蛇（只处理重生队列中到期的，不遍历所有蛇）"""
+        for player_id in self.respawn_queue.pop_due(self.tick):
+            snake = self.snakes.get(player_id)
+            if snake is None or snake.alive:
+                continue  # 已经离开或已经重生
+            start_pos = self.spawn_position(snake.color_index)
+            if start_pos is None:
+                # 没有安全位置，下个tick再试
+                self.respawn_queue.schedule(player_id, self.tick + 1)
+                continue
+            snake.body.reset([start_pos, (start_pos[0] - 1, start_pos[1]), (start_pos[0] - 2, start_pos[1])])
+            snake.direction = Direction.RIGHT
+            snake.grow_pending = False
+            snake.alive = True
+            snake.score = 0
+            self.index_snake(player_id, snake)
+            self.events.emit("respawn", player_id=player_id, position=start_pos)
+
+    def checkpoint_state(self) -> dict:
+        """热重启用的完整房间状态：蛇、食物、分数、tick、随机数状态和恢复令牌"""
+        version, internal, gauss = self.rng.getstate()
+        bot_ids = set(self.bot_controller.bot_ids)
+        return {
+            "saved_at": time.time(),
+            "grid_size": [self.GRID_WIDTH, self.GRID_HEIGHT],
+            "tick": self.tick,
+            "frame_seq": self.frame_seq,
+            "rng": [version, list(internal), gauss],
+            "snakes": {player_id: {
+                "body": list(snake.body),
+                "direction": snake.direction.name,
+                "grow_pending": snake.grow_pending,
+                "color_index": snake.color_index,
+                "alive": snake.alive,
+                "score": snake.score,
+                "bot": player_id in bot_ids,
+            } for player_id, snake in self.snakes.items()},
+            "foods": list(self.foods),
+            "resume_tokens": self.resume_tokens,
+            "last_input_seq": self.last_input_seq,
+            "acked_seq": self.acked_seq,
+        }
 
-    async def broadcast_game_state(self):
-        """广播游戏状态给所有玩家"""
-        if not self.players:
+    def restore_checkpoint(self, state: dict) -> int:
+        """从检查点恢复房间，返回恢复的玩家数
+
+        真人玩家恢复为断线保留状态，客户端带原来的恢复令牌重连即可继续；
+        不保留断线会话（RESUME_GRACE 为 0）时只恢复机器人和食物。
+        必须在事件循环中调用（断线保留需要定时器）。
+        """
+        if state["grid_size"] != [self.GRID_WIDTH, self.GRID_HEIGHT]:
+            raise ValueError(f"检查点的地图大小 {state['grid_size']} 与当前配置不一致")
+
+        for position in list(self.foods):
+            self.food_index.remove(position, position)
+        self.foods.clear()
+        for player_id in list(self.snakes):
+            self.remove_snake(player_id)
+
+        self.respawn_queue.clear()
+        self.tick = state["tick"]
+        self.frame_seq = state["frame_seq"]
+        version, internal, gauss = state["rng"]
+        self.rng.setstate((version, tuple(internal), gauss))
+        for position in state["foods"]:
+            position = tuple(position)
+            self.foods.add(position)
+            self.food_index.add(position, position)
+
+        loop = asyncio.get_running_loop()
+        restored = 0
+        for player_id, data in state["snakes"].items():
+            if not data["bot"] and self.RESUME_GRACE <= 0:
+                continue
+            snake = Snake(player_id, (0, 0), data["color_index"])
+            self.used_colors.add(snake.color_index)
+            snake.body.reset([tuple(segment) for segment in data["body"]])
+            snake.direction = Direction[data["direction"]]
+            snake.grow_pending = data["grow_pending"]
+            snake.alive = data["alive"]
+            snake.score = data["score"]
+            self.snakes[player_id] = snake
+            if snake.alive:
+                self.index_snake(player_id, snake)
+            else:
+                self.respawn_queue.schedule(player_id, self.tick + 1)
+            if data["bot"]:
+                self.bot_controller.add(player_id)
+                continue
+            self.suspended[player_id] = (loop.call_later(self.RESUME_GRACE, self.expire_session, player_id),
+                                         self.tick)
+            restored += 1
+
+        self.resume_tokens = {token: player_id for token, player_id in state["resume_tokens"].items()
+                              if player_id in self.suspended}
+        self.last_input_seq = {player_id: seq for player_id, seq in state["last_input_seq"].items()
+                               if player_id in self.snakes}
+        self.acked_seq = {player_id: seq for player_id, seq in state["acked_seq"].items()
+                          if player_id in self.snakes}
+        self.balance_bots()
+        self.generate_foods(self.FOOD_COUNT)
+        self.events.emit("checkpoint_restored", tick=self.tick, players=restored,
+                         bots=len(self.bot_controller.bot_ids), age=round(time.time() - state["saved_at"], 3))
+        return restored
+
+    def record_score(self, snake: Snake):
+        """得分事件：交给排行榜做增量更新"""
+        if self.leaderboard:
+            color = PlayerColors.COLORS[snake.color_index % len(PlayerColors.COLORS)]
+            name = f"{color['name']}-{snake.player_id[-4:]}"
+            if self.ticking:
+                # 排行榜由所有房间共享，只在事件循环线程上修改
+                player_id, score = snake.player_id, snake.score
+                self.after_tick.append(lambda: self.leaderboard.record(player_id, name, score))
+                return
+            self.leaderboard.record(snake.player_id, name, snake.score)
+
+    def latency_metrics(self) -> Dict[str, dict]:
+        """各连接的往返时延统计"""
+        return {player_id: stats.summary() for player_id, stats in self.rtt_stats.items()}
+
+    def leaderboard_message(self) -> str:
+        return json.dumps({"type": "leaderboard", "entries": self.leaderboard.entries()})
+
+    async def broadcast_leaderboard(self):
+        """排行榜有变化时推送给所有玩家"""
+        if not self.leaderboard or self.leaderboard.version == self.sent_leaderboard_version:
             return
+        self.sent_leaderboard_version = self.leaderboard.version
+
+        message = self.leaderboard_message()
+        for websocket in list(self.players.values()):
+            try:
+                await websocket.send(message)
+            except websockets.exceptions.ConnectionClosed:
+                pass
+
+    def snake_state(self, snake: Snake) -> dict:
+        return {
+            "body": list(snake.body),
+            "alive": snake.alive,
+            "score": snake.score,
+            "color_index": snake.color_index % len(PlayerColors.COLORS)
+        }
 
-        # 构建游戏状态
+    def build_game_state(self) -> dict:
+        """构建完整的游戏状态"""
         game_state = {
             "type": "game_state",
+            "seq": self.frame_seq,
+            "tick": self.tick,
+            "acks": self.acked_seq,
             "snakes": {},
-            "foods": [{"position": food.position} for food in self.foods],
+            "foods": [{"position": position} for position in self.foods],
             "grid_size": {"width": self.GRID_WIDTH, "height": self.GRID_HEIGHT},
             "colors": PlayerColors.COLORS
         }
 
         for player_id, snake in self.snakes.items():
-            game_state["snakes"][player_id] = {
-                "body": snake.body,
-                "alive": snake.alive,
-                "score": snake.score,
-                "color_index": snake.color_index
-            }
+            game_state["snakes"][player_id] = self.snake_state(snake)
+
+        return game_state
+
+    def publish_frame(self):
+        if self.frame_publisher is None:
+            return
+        if not self.frame_publisher.publish(self.encode_game_state()):
+            self.events.emit("shm_frame_too_large", logging.WARNING, capacity=self.frame_publisher.capacity)
+
+    def encode_game_state(self) -> bytes:
+        """完整游戏状态的二进制帧，坐标直接从蛇身和食物的数组中拷贝"""
+        return self.frame_encoder.encode(self.frame_seq, self.tick, self.GRID_WIDTH, self.GRID_HEIGHT,
+                                         self.snakes, self.foods, self.acked_seq, len(PlayerColors.COLORS))
+
+    def build_view_state(self, player_id: str) -> dict:
+        """构建某个玩家视野范围内的游戏状态
+
+        只查询视野覆盖到的区块，编码开销与地图大小无关。
+        视野外的蛇身会被裁掉，"head_in_view" 标明蛇头是否在视野内。
+        """
+        own_snake = self.snakes.get(player_id)
+        if own_snake and own_snake.body:
+            center_x, center_y = own_snake.body[0]
+        else:
+            center_x, center_y = self.GRID_WIDTH // 2, self.GRID_HEIGHT // 2
+
+        radius = self.VIEW_RADIUS
+        x0 = max(0, min(center_x - radius, self.GRID_WIDTH - 2 * radius - 1))
+        y0 = max(0, min(center_y - radius, self.GRID_HEIGHT - 2 * radius - 1))
+        x1 = min(self.GRID_WIDTH - 1, x0 + 2 * radius)
+        y1 = min(self.GRID_HEIGHT - 1, y0 + 2 * radius)
+
+        visible_ids = self.snake_index.query(x0, y0, x1, y1)
+        visible_ids.add(player_id)
+
+        snakes = {}
+        for snake_id in visible_ids:
+            snake = self.snakes.get(snake_id)
+            if snake is None:
+                continue
+            state = self.snake_state(snake)
+            if snake_id != player_id:
+                state["body"] = [segment for segment in snake.body
+                                 if x0 <= segment[0] <= x1 and y0 <= segment[1] <= y1]
+                if not state["body"]:
+                    continue
+                state["head_in_view"] = state["body"][0] == snake.body[0]
+            snakes[snake_id] = state
+
+        foods = [{"position": position} for position in self.food_index.query(x0, y0, x1, y1)
+                 if x0 <= position[0] <= x1 and y0 <= position[1] <= y1]
+
+        # 进入/离开视野事件
+        visible = set(snakes)
+        previous = self.visible_snakes.get(player_id, set())
+        self.visible_snakes[player_id] = visible
+
+        return {
+            "type": "game_state",
+            "seq": self.frame_seq,
+            "tick": self.tick,
+            "acks": {player_id: self.acked_seq[player_id]} if player_id in self.acked_seq else {},
+            "snakes": snakes,
+            "foods": foods,
+            "grid_size": {"width": self.GRID_WIDTH, "height": self.GRID_HEIGHT},
+            "view": {"x": x0, "y": y0, "width": x1 - x0 + 1, "height": y1 - y0 + 1},
+            "entered": sorted(visible - previous),
+            "left": sorted(previous - visible),
+            "colors": PlayerColors.COLORS
+        }
 
-        message = json.dumps(game_state)
+    async def broadcast_game_state(self):
+        """广播游戏状态给所有玩家"""
+        await self.state_ready()
+        if not self.players:
+            return
 
-        # 发送给所有连接的玩家
-        disconnected_players = []
-        for player_id, websocket in self.players.items():
+        self.frame_seq += 1
+        if self.VIEW_RADIUS is None:
+            # 两种格式各编码一次，所有玩家共享
+            # binary_players 里可能还有断线保留中的玩家，只按当前连接的玩家决定编码哪种格式
+            binary_ids = self.binary_players & self.players.keys()
+            binary = self.encode_game_state() if binary_ids else None
+            message = json.dumps(self.build_game_state()) if len(binary_ids) < len(self.players) else None
+            messages = {player_id: binary if player_id in binary_ids else message
+                        for player_id in self.players}
+        else:
+            messages = {player_id: json.dumps(self.build_view_state(player_id))
+                        for player_id in self.players}
+
+        # 发送给所有连接的玩家；断开的连接留到下一个tick的清理阶段统一处理，
+        # 这里不逐个注销也不重新广播，同时断开很多连接也只多一次遍历
+        for player_id in list(self.players):
+            channel = self.channels.get(player_id)
+            if channel is None or player_id in self.pending_disconnects:
+                continue
             try:
-                await websocket.send(message)
+                await channel.send(messages[player_id])
             except websockets.exceptions.ConnectionClosed:
-                disconnected_players.append(player_id)
+                self.pending_disconnects[player_id] = self.players.get(player_id)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="多人贪吃蛇游戏服务器")
+    parser.add_argument("--width", type=int, default=50, help="地图宽度（格）")
+    parser.add_argument("--height", type=int, default=35, help="地图高度（格）")
+    parser.add_argument("--max-players", type=int, default=5, help="最大玩家数")
+    parser.add_argument("--foods", type=int, default=None, help="食物数量，默认按地图面积计算")
+    parser.add_argument("--view-radius", type=int, default=None,
+                        help="视野半径（格），设置后只同步玩家周围的实体")
+    parser.add_argument("--bots", type=int, default=0,
+                        help="房间保持的蛇的数量，真人不足时用机器人补齐")
+    parser.add_argument("--leaderboard-db", default="leaderboard.db",
+                        help="排行榜数据库文件（SQLite），传空字符串关闭排行榜")
+    parser.add_argument("--log-file", default=None, help="事件日志文件（JSON lines），默认输出到标准输出")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="事件日志级别，DEBUG 会记录每次吃到食物")
+    parser.add_argument("--log-sample", nargs="*", default=[], metavar="EVENT=RATE",
+                        help="按事件采样，例如 food=0.1 只记录10%%的吃食物事件")
+    parser.add_argument("--udp-port", type=int, default=None,
+                        help="开启UDP状态帧通道的端口（默认只使用websocket）")
+    parser.add_argument("--resume-grace", type=float, default=15.0,
+                        help="断线后保留蛇等待重连的秒数，0 表示断线立即移除")
+    parser.add_argument("--publish-shm", default=None, metavar="NAME",
+                        help="把每个tick的状态帧发布到指定名称的共享内存（python -m online.shared_frames NAME 读取）")
+    parser.add_argument("--record", default=None, metavar="FILE",
+                        help="把对局逐帧录制到文件（JSON lines），可用 replay_render.py 渲染")
+    parser.add_argument("--tick-workers", type=int, default=4,
+                        help="执行房间tick的工作线程数，0 表示直接在事件循环中执行")
+    parser.add_argument("--max-rooms", type=int, default=4,
+                        help="最多同时开放的房间数，房间都满时新玩家在大厅排队")
+    parser.add_argument("--admit-rate", type=float, default=20,
+                        help="大厅每秒最多放行的玩家数（重启后大量重连时分批进入）")
+    parser.add_argument("--max-queue", type=int, default=1000, help="大厅最多排队人数")
+    parser.add_argument("--tick-rate", type=float, default=10, help="基础tick频率（Hz）")
+    parser.add_argument("--fast-tick-rate", type=float, default=15,
+                        help="2~4名真人玩家的小房间使用的tick频率（Hz）")
+    parser.add_argument("--min-tick-rate", type=float, default=5, help="主机过载时最低降到的tick频率（Hz）")
+    parser.add_argument("--idle-timeout", type=float, default=60,
+                        help="所有玩家超过该秒数没有输入时暂停房间，直到下一次输入（0 表示不暂停）")
+    parser.add_argument("--respawn-delay", type=float, default=0, help="蛇死亡后等待多少秒重生")
+    parser.add_argument("--checkpoint", default=None, metavar="FILE",
+                        help="收到 SIGTERM 时把房间状态保存到该文件，启动时如果文件存在则从中恢复（热重启）")
+    parser.add_argument("--large", action="store_true",
+                        help="大地图模式：2000x2000，最多500人，视野半径30")
+    args = parser.parse_args(argv)
+
+    if args.large:
+        args.width = args.height = 2000
+        args.max_players = 500
+        args.view_radius = args.view_radius or 30
+    if args.foods is None:
+        # 默认地图 50x35 对应 8 个食物
+        args.foods = max(8, args.width * args.height // 220)
+    return args
+
+
+def restore_from_checkpoint(lobby, path: str):
+    """启动时读取检查点并恢复所有房间，读取后删除文件，避免之后的重启再次恢复旧状态"""
+    try:
+        state = read_checkpoint(path)
+    except ValueError as e:
+        print(f"* 忽略检查点: {e}")
+        return
+    if state is None:
+        return
+    os.remove(path)
+
+    age = time.time() - state.get("saved_at", 0)
+    if age > CHECKPOINT_MAX_AGE:
+        print(f"* 检查点已保存 {age:.0f} 秒，超过 {CHECKPOINT_MAX_AGE:.0f} 秒，不再恢复")
+        return
+    for index, room_state in enumerate(state["rooms"]):
+        room = lobby.rooms[index] if index < len(lobby.rooms) else lobby.create_room()
+        try:
+            restored = room.restore_checkpoint(room_state)
+        except ValueError as e:
+            print(f"* 忽略检查点: {e}")
+            return
+        print(f"* 已从检查点恢复房间 {index + 1}: tick {room.tick}，{restored} 名玩家等待重连，"
+              f"{len(room.bot_controller.bot_ids)} 个机器人")
 
-        # 清理断开连接的玩家
-        for player_id in disconnected_players:
-            await self.unregister_player(player_id)
 
+async def main(argv=None):
+    from online.lobby import Lobby
+
+    args = parse_args(argv)
 
-async def main():
     print("* 多人贪吃蛇游戏服务器启动中...")
     print("服务器地址: ws://localhost:8765")
-    print("最大玩家数: 5")
-    print("游戏区域: 50x35")
-
-    game_server = GameServer()
+    print(f"每个房间最大玩家数: {args.max_players}，最多 {args.max_rooms} 个房间")
+    print(f"游戏区域: {args.width}x{args.height}")
+    if args.view_radius is not None:
+        print(f"视野半径: {args.view_radius}")
+    if args.bots:
+        print(f"机器人补位: {args.bots}")
+
+    event_log = EventLog(args.log_file, getattr(logging, args.log_level), parse_sample_rates(args.log_sample))
+    event_log.start()
+    leaderboard = Leaderboard(args.leaderboard_db) if args.leaderboard_db else None
+
+    # 所有房间共用一个tick线程池，事件循环只负责网络I/O
+    tick_executor = (ThreadPoolExecutor(args.tick_workers, thread_name_prefix="room-tick")
+                     if args.tick_workers > 0 else None)
+
+    def create_room() -> GameServer:
+        return GameServer(args.width, args.height, args.max_players, args.foods, args.view_radius, args.bots,
+                          leaderboard, event_log, args.resume_grace,
+                          tick_policy=TickPolicy(args.tick_rate, args.fast_tick_rate, args.min_tick_rate),
+                          idle_timeout=args.idle_timeout, respawn_delay=args.respawn_delay,
+                          tick_executor=tick_executor)
+
+    # 新连接先进入大厅排队，再分配到房间；共享内存发布和录制只针对第一个房间
+    lobby = Lobby(create_room, args.max_rooms, args.admit_rate, args.max_queue, event_log)
+    game_server = lobby.create_room()
 
-    async with websockets.serve(game_server.register_player, "localhost", 8765):
-        print("* 服务器已启动，等待玩家连接...")
-        await asyncio.Future()  # 保持服务器运行
+    try:
+        if args.udp_port:
+            await lobby.start_udp("localhost", args.udp_port)
+            print(f"UDP状态帧端口: {args.udp_port}")
+        if args.publish_shm:
+            game_server.frame_publisher = FramePublisher(args.publish_shm)
+            print(f"共享内存状态帧: {args.publish_shm}")
+        if args.record:
+            game_server.recorder = MatchRecorder(args.record)
+            game_server.recorder.start({"grid_size": {"width": args.width, "height": args.height},
+                                        "colors": PlayerColors.COLORS, "tick_rate": game_server.GAME_SPEED})
+            print(f"对局录制: {args.record}")
+        if args.checkpoint:
+            restore_from_checkpoint(lobby, args.checkpoint)
+        lobby.start()
+
+        # SIGTERM：保存检查点后退出，新进程用同一个 --checkpoint 启动即可接上
+        stop = asyncio.get_running_loop().create_future()
+        try:
+            asyncio.get_running_loop().add_signal_handler(
+                signal.SIGTERM, lambda: stop.done() or stop.set_result(None))
+        except NotImplementedError:
+            pass  # Windows 不支持，只能用 Ctrl+C 退出
+
+        # 限制单帧大小，超大的消息在websockets层就被拒绝，不会整条读进内存
+        async with websockets.serve(lobby.handle_connection, "localhost", 8765, max_size=4 * MAX_MESSAGE_SIZE):
+            print("* 服务器已启动，等待玩家连接...")
+            await stop
+            # 先停止tick并保存，再关闭连接；之后的断线不会再改变房间状态
+            for room in lobby.rooms:
+                room.game_running = False
+            for room in lobby.rooms:
+                await room.state_ready()
+            if args.checkpoint:
+                write_checkpoint(args.checkpoint, {"saved_at": time.time(),
+                                                   "rooms": [room.checkpoint_state() for room in lobby.rooms]})
+                event_log.emit("checkpoint_saved", path=args.checkpoint, rooms=len(lobby.rooms),
+                               snakes=sum(len(room.snakes) for room in lobby.rooms))
+                print(f"\n* 已保存检查点: {args.checkpoint}（{len(lobby.rooms)} 个房间）")
+    finally:
+        if tick_executor:
+            tick_executor.shutdown()
+        if game_server.frame_publisher:
+            game_server.frame_publisher.close()
+        if game_server.recorder:
+            game_server.recorder.close()
+        if leaderboard:
+            leaderboard.close()
+        event_log.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,85 @@
+from typing import Dict, Hashable, Set, Tuple
+
+
+class SpatialIndex:
+    """按区块划分的空间索引
+
+    同时维护两层信息：
+    - cells: 每个格子上有哪些实体（用于碰撞检测、占用判断）
+    - chunks: 每个区块里有哪些实体（用于按视野范围查询）
+
+    所有操作的开销只与被查询的范围有关，与整个世界的大小无关。
+    """
+
+    def __init__(self, chunk_size: int = 16):
+        self.chunk_size = chunk_size
+        self.cells: Dict[Tuple[int, int], Dict[Hashable, int]] = {}
+        self.chunks: Dict[Tuple[int, int], Dict[Hashable, int]] = {}
+        # 可选的监听者：区块从空变为有实体时调用 chunk_occupied(chunk)，变空时调用 chunk_freed(chunk)
+        self.listener = None
+
+    def chunk_of(self, pos: Tuple[int, int]) -> Tuple[int, int]:
+        """格子坐标所在的区块坐标"""
+        return pos[0] // self.chunk_size, pos[1] // self.chunk_size
+
+    def add(self, key: Hashable, pos: Tuple[int, int]):
+        """记录实体 key 占用了格子 pos（同一实体可多次占用同一格）"""
+        occupants = self.cells.setdefault(pos, {})
+        occupants[key] = occupants.get(key, 0) + 1
+
+        chunk = self.chunk_of(pos)
+        members = self.chunks.get(chunk)
+        if members is None:
+            members = self.chunks[chunk] = {}
+            if self.listener is not None:
+                self.listener.chunk_occupied(chunk)
+        members[key] = members.get(key, 0) + 1
+
+    def remove(self, key: Hashable, pos: Tuple[int, int]):
+        """取消实体 key 对格子 pos 的一次占用"""
+        occupants = self.cells.get(pos)
+        if not occupants or key not in occupants:
+            return
+        occupants[key] -= 1
+        if occupants[key] == 0:
+            del occupants[key]
+            if not occupants:
+                del self.cells[pos]
+
+        chunk = self.chunk_of(pos)
+        members = self.chunks[chunk]
+        members[key] -= 1
+        if members[key] == 0:
+            del members[key]
+            if not members:
+                del self.chunks[chunk]
+                if self.listener is not None:
+                    self.listener.chunk_freed(chunk)
+
+    def count(self, pos: Tuple[int, int]) -> int:
+        """格子 pos 上的占用总数"""
+        occupants = self.cells.get(pos)
+        return sum(occupants.values()) if occupants else 0
+
+    def is_free(self, pos: Tuple[int, int]) -> bool:
+        return pos not in self.cells
+
+    def query(self, x0: int, y0: int, x1: int, y1: int) -> Set[Hashable]:
+        """返回与矩形 [x0, x1] x [y0, y1]（闭区间）所覆盖区块有交集的实体"""
+        result = set()
+        cx0, cy0 = self.chunk_of((x0, y0))
+        cx1, cy1 = self.chunk_of((x1, y1))
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                members = self.chunks.get((cx, cy))
+                if members:
+                    result.update(members)
+        return result
+
+    def clear(self):
+        chunks = list(self.chunks)
+        self.cells.clear()
+        self.chunks.clear()
+        if self.listener is not None:
+            for chunk in chunks:
+                self.listener.chunk_freed(chunk)
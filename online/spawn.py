@@ -0,0 +1,109 @@
+import heapq
+import random
+from typing import Dict, List, Optional, Tuple
+
+from online.spatial_index import SpatialIndex
+
+
+class SpawnFinder:
+    """为新蛇和重生的蛇寻找安全的出生位置
+
+    蛇出生时朝右，蛇身在蛇头左边。安全位置要求蛇身所在格子和蛇头前方 runway 格都在地图内且没有蛇。
+    作为蛇空间索引的监听者维护“完全没有蛇的区块”集合，区块有蛇进入或全部离开时 O(1) 更新；
+    找位置时从集合中随机取一个区块，区块内任意位置都是安全的，不需要扫描地图。
+    没有空区块（地图拥挤）时随机抽样若干位置逐个检查，仍然找不到就返回 None，由调用方稍后重试。
+    """
+
+    def __init__(self, grid_width: int, grid_height: int, snake_index: SpatialIndex,
+                 length: int = 3, runway: int = 5, rng: Optional[random.Random] = None):
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.snake_index = snake_index
+        self.length = length
+        self.runway = runway
+        self.rng = rng or random.Random()
+
+        # 空区块：列表 + 下标字典，随机选取和删除都是 O(1)
+        self.free_chunks: List[Tuple[int, int]] = []
+        self.slots: Dict[Tuple[int, int], int] = {}
+        size = snake_index.chunk_size
+        for cx in range((grid_width + size - 1) // size):
+            for cy in range((grid_height + size - 1) // size):
+                if (cx, cy) not in snake_index.chunks:
+                    self.chunk_freed((cx, cy))
+        snake_index.listener = self
+
+    def chunk_bounds(self, chunk: Tuple[int, int]) -> Tuple[int, int, int, int]:
+        """区块在地图内的格子范围 (x0, y0, x1, y1)，闭区间"""
+        size = self.snake_index.chunk_size
+        x0, y0 = chunk[0] * size, chunk[1] * size
+        return x0, y0, min(x0 + size, self.grid_width) - 1, min(y0 + size, self.grid_height) - 1
+
+    def chunk_freed(self, chunk: Tuple[int, int]):
+        if chunk in self.slots or chunk[0] < 0 or chunk[1] < 0:
+            return  # 撞墙的蛇头会短暂出现在地图外的区块
+        x0, y0, x1, y1 = self.chunk_bounds(chunk)
+        # 地图外的区块，或地图边缘太窄、放不下蛇身加前方空地的区块
+        if x1 - x0 + 1 < self.length + self.runway or y1 < y0:
+            return
+        self.slots[chunk] = len(self.free_chunks)
+        self.free_chunks.append(chunk)
+
+    def chunk_occupied(self, chunk: Tuple[int, int]):
+        slot = self.slots.pop(chunk, None)
+        if slot is None:
+            return
+        last = self.free_chunks.pop()
+        if last != chunk:
+            self.free_chunks[slot] = last
+            self.slots[last] = slot
+
+    def is_safe(self, head: Tuple[int, int]) -> bool:
+        x, y = head
+        if not (0 <= y < self.grid_height and self.length - 1 <= x < self.grid_width - self.runway):
+            return False
+        is_free = self.snake_index.is_free
+        return all(is_free((cell_x, y)) for cell_x in range(x - self.length + 1, x + self.runway + 1))
+
+    def find(self, preferred: Optional[Tuple[int, int]] = None, attempts: int = 20) -> Optional[Tuple[int, int]]:
+        """返回一个安全的蛇头位置；preferred 安全时优先使用"""
+        if preferred is not None and self.is_safe(preferred):
+            return preferred
+
+        if self.free_chunks:
+            x0, y0, x1, y1 = self.chunk_bounds(self.rng.choice(self.free_chunks))
+            return (self.rng.randint(x0 + self.length - 1, x1 - self.runway),
+                    self.rng.randint(y0, y1))
+
+        if self.grid_width < self.length + self.runway:
+            return None
+        for _ in range(attempts):
+            head = (self.rng.randint(self.length - 1, self.grid_width - self.runway - 1),
+                    self.rng.randint(0, self.grid_height - 1))
+            if self.is_safe(head):
+                return head
+        return None
+
+
+class RespawnQueue:
+    """按到期tick排序的重生队列，每个tick只取出到期的蛇，不需要遍历所有蛇"""
+
+    def __init__(self):
+        self.heap: List[Tuple[int, int, str]] = []
+        self.counter = 0  # 同一tick到期时按加入顺序处理
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def schedule(self, player_id: str, due_tick: int):
+        self.counter += 1
+        heapq.heappush(self.heap, (due_tick, self.counter, player_id))
+
+    def pop_due(self, tick: int) -> List[str]:
+        due = []
+        while self.heap and self.heap[0][0] <= tick:
+            due.append(heapq.heappop(self.heap)[2])
+        return due
+
+    def clear(self):
+        self.heap.clear()
@@ -0,0 +1,77 @@
+import math
+import os
+import time
+from typing import Optional
+
+
+class HostLoad:
+    """估计主机的繁忙程度（0~1），同一进程内的所有房间共享一个实例
+
+    - 房间每个tick上报 update_game 本身的计算耗时（不含线程池排队和发送状态帧的等待），
+      按指数衰减累计为“tick占用的时间比例”
+    - 系统支持时再参考 1 分钟平均负载（每个CPU），取两者的较大值
+    """
+
+    def __init__(self, tau: float = 2.0):
+        self.tau = tau
+        self.busy = 0.0  # 衰减后的繁忙比例
+        self.last = time.monotonic()
+        self.system_load = 0.0
+        self.next_system_sample = 0.0
+        self.cpus = os.cpu_count() or 1
+
+    def add_busy(self, seconds: float):
+        now = time.monotonic()
+        self.busy = self.busy * math.exp(-(now - self.last) / self.tau) + seconds / self.tau
+        self.last = now
+
+    def tick_load(self) -> float:
+        """只看本进程各房间tick占用的时间比例，不受其他进程影响"""
+        return self.busy * math.exp(-(time.monotonic() - self.last) / self.tau)
+
+    def utilization(self) -> float:
+        now = time.monotonic()
+        busy = self.tick_load()
+        if now >= self.next_system_sample:
+            self.next_system_sample = now + 1.0
+            try:
+                self.system_load = os.getloadavg()[0] / self.cpus
+            except (AttributeError, OSError):
+                self.system_load = 0.0  # Windows 没有平均负载
+        return max(busy, self.system_load)
+
+
+# 默认整个进程共用一个负载估计
+HOST_LOAD = HostLoad()
+
+
+class TickPolicy:
+    """按房间情况决定tick频率
+
+    - 2 ~ small_room 个真人玩家的小房间用 fast_rate，对抗更灵敏
+    - 主机繁忙时逐步降低频率（最低 min_rate），负载下降后再逐步恢复
+    """
+
+    HIGH_LOAD = 0.75
+    LOW_LOAD = 0.4
+
+    def __init__(self, base_rate: float = 10, fast_rate: Optional[float] = 15, min_rate: float = 5,
+                 small_room: int = 4, host_load: Optional[HostLoad] = None):
+        self.base_rate = base_rate
+        self.fast_rate = fast_rate or base_rate
+        self.min_rate = min(min_rate, base_rate)
+        self.small_room = small_room
+        self.host_load = host_load or HOST_LOAD
+        self.scale = 1.0  # 过载时的降频系数
+        self.rate = base_rate
+
+    def next_rate(self, humans: int) -> float:
+        """每个tick结束后调用，返回下一个tick使用的频率"""
+        target = self.fast_rate if 2 <= humans <= self.small_room else self.base_rate
+        load = self.host_load.utilization()
+        if load > self.HIGH_LOAD:
+            self.scale = max(self.min_rate / target, self.scale * 0.9)
+        elif load < self.LOW_LOAD:
+            self.scale = min(1.0, self.scale * 1.05)
+        self.rate = max(self.min_rate, target * self.scale)
+        return self.rate
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Callable, Optional, Tuple
+
+from online.world_state import decode_frame, is_binary_frame
+
+# 单个UDP数据报允许的最大输入消息长度，超过的直接丢弃，不做JSON解析
+MAX_UDP_INPUT_SIZE = 512
+# 单个UDP数据报的最大长度（IPv4），超过的状态帧无法用UDP发送
+MAX_UDP_DATAGRAM = 65507
+# 客户端每次发送输入时附带的最近输入条数，丢包时后续数据报可以补上
+REDUNDANT_INPUTS = 3
+# 客户端发送 ping 的间隔（秒）
+PING_INTERVAL = 1.0
+# 单条websocket消息的最大长度，超过的不做JSON解析直接丢弃（协议中最长的消息也远小于此）
+MAX_MESSAGE_SIZE = 512
+# 每个连接每秒允许的消息数和突发上限；每秒被丢弃的消息超过 FLOOD_DROPS 条时断开连接
+INPUT_RATE = 30.0
+INPUT_BURST = 20
+FLOOD_DROPS = 60
+
+
+class TokenBucket:
+    """令牌桶限流：每秒补充 rate 个令牌，最多积攒 burst 个，每条消息消耗一个"""
+
+    def __init__(self, rate: float = INPUT_RATE, burst: int = INPUT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self.dropped = 0  # 累计丢弃的消息数
+        self.window_start = self.last
+        self.window_drops = 0  # 最近一秒内丢弃的消息数，用于判断是否恶意刷屏
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+
+        self.dropped += 1
+        if now - self.window_start >= 1.0:
+            self.window_start, self.window_drops = now, 0
+        self.window_drops += 1
+        return False
+
+    def flooding(self) -> bool:
+        return self.window_drops > FLOOD_DROPS
+
+
+class LatencyStats:
+    """往返时延统计：最近值、平滑均值、抖动和最小值（毫秒）
+
+    抖动按 RFC 3550 的方式对相邻两次 RTT 的差做指数平滑。
+    传入服务器时间戳时同时估计时钟偏差：取最近若干次中 RTT 最小的一次，
+    假设往返对称，偏差 = 服务器时间 - (发送时间 + RTT / 2)。
+    """
+
+    def __init__(self, window: int = 16):
+        self.samples = 0
+        self.last: Optional[float] = None
+        self.avg: Optional[float] = None
+        self.jitter = 0.0
+        self.min: Optional[float] = None
+        self.offset: Optional[float] = None  # 服务器时钟 - 本地时钟（毫秒）
+        self.recent = deque(maxlen=window)  # (rtt, 偏差)
+
+    def add(self, rtt: float, sent: Optional[float] = None, server_time: Optional[float] = None):
+        if self.last is not None:
+            self.jitter += (abs(rtt - self.last) - self.jitter) / 16
+        self.avg = rtt if self.avg is None else self.avg + (rtt - self.avg) / 8
+        self.min = rtt if self.min is None else min(self.min, rtt)
+        self.last = rtt
+        self.samples += 1
+
+        if sent is not None and server_time is not None:
+            self.recent.append((rtt, (server_time - sent) * 1000 - rtt / 2))
+            self.offset = min(self.recent)[1]
+
+    def summary(self) -> dict:
+        if self.avg is None:
+            return {"samples": 0}
+        return {"samples": self.samples, "rtt_ms": round(self.avg, 1), "jitter_ms": round(self.jitter, 1),
+                "min_rtt_ms": round(self.min, 1)}
+
+
+class WebSocketChannel:
+    """默认的状态帧通道：直接通过玩家的websocket连接发送"""
+
+    name = "websocket"
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+
+    async def send(self, message: str):
+        await self.websocket.send(message)
+
+
+class UdpChannel:
+    """UDP状态帧通道：每帧一个数据报，丢失的帧不重传，客户端按序号丢弃过期帧"""
+
+    name = "udp"
+
+    def __init__(self, endpoint: "UdpServerProtocol", addr: Tuple[str, int], fallback: WebSocketChannel,
+                 on_oversized: Optional[Callable[[int], None]] = None):
+        self.endpoint = endpoint
+        self.addr = addr
+        # 超过数据报上限的帧（大地图的完整帧）改走websocket，否则 sendto 失败后帧会被静默丢弃
+        self.fallback = fallback
+        self.on_oversized = on_oversized
+        self.oversized = 0
+
+    async def send(self, message):
+        data = message if isinstance(message, bytes) else message.encode("utf-8")
+        if len(data) > MAX_UDP_DATAGRAM:
+            self.oversized += 1
+            if self.on_oversized is not None:
+                self.on_oversized(len(data))
+            await self.fallback.send(message)
+            return
+        self.endpoint.send(data, self.addr)
+
+
+class UdpServerProtocol(asyncio.DatagramProtocol):
+    """服务器端的UDP端点
+
+    只承载状态帧（服务器 -> 客户端）和方向输入（客户端 -> 服务器），
+    加入、离开、错误等需要可靠送达的消息仍然走websocket。
+    """
+
+    def __init__(self, on_datagram: Callable[[dict, Tuple[str, int]], None]):
+        self.on_datagram = on_datagram
+        self.transport: Optional[asyncio.DatagramTransport] = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        if len(data) > MAX_UDP_INPUT_SIZE:
+            return
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+        if isinstance(message, dict):
+            self.on_datagram(message, addr)
+
+    def send(self, message, addr: Tuple[str, int]):
+        """发送一个状态帧，message 为JSON文本或二进制帧"""
+        if self.transport is not None:
+            self.transport.sendto(message if isinstance(message, bytes) else message.encode("utf-8"), addr)
+
+
+class UdpClientProtocol(asyncio.DatagramProtocol):
+    """客户端的UDP端点：收到的状态帧交给回调处理"""
+
+    def __init__(self, on_message: Callable[[dict], None]):
+        self.on_message = on_message
+        self.transport: Optional[asyncio.DatagramTransport] = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        try:
+            message = decode_frame(data) if is_binary_frame(data) else json.loads(data)
+        except ValueError:
+            return
+        if isinstance(message, dict):
+            self.on_message(message)
+
+    def send(self, message: dict):
+        if self.transport is not None:
+            self.transport.sendto(json.dumps(message).encode("utf-8"))
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
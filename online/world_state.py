@@ -0,0 +1,266 @@
+import struct
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+# 二进制状态帧格式（小端）：
+#   帧头   FRAME_HEADER：魔数、版本、序号、tick、地图宽高、蛇数、食物数、确认数
+#   确认   每条：玩家ID长度(u8) + 玩家ID + 输入序号(u32)
+#   蛇     每条：SNAKE_HEADER（玩家ID长度、颜色、是否存活、分数、长度）+ 玩家ID + 长度 * 2 个 int16 坐标（蛇头在前）
+#   食物   食物数 * 2 个 int16 坐标
+FRAME_MAGIC = b"SF"
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct("<2sBxIIHHHHH")
+SNAKE_HEADER = struct.Struct("<BBBxII")
+ACK_SEQ = struct.Struct("<I")
+MAX_INPUT_SEQ = 2 ** 32 - 1  # 输入序号的上限，服务器丢弃超出范围的输入
+
+# 坐标数组按本机字节序存放，大端机器上编码/解码时需要交换字节
+_SWAP = sys.byteorder != "little"
+
+
+class BodyRing:
+    """蛇身：坐标按 x, y 交替存放在 int16 环形数组中，蛇头在逻辑下标 0
+
+    移动只改写一个槽位和起止位置，不创建新的列表；编码状态帧时
+    直接按一到两段 memoryview 切片拷贝坐标。
+    """
+
+    __slots__ = ("coords", "capacity", "start", "length")
+
+    def __init__(self, segments: Iterable[Tuple[int, int]]):
+        self.reset(segments)
+
+    def reset(self, segments: Iterable[Tuple[int, int]]):
+        segments = list(segments)
+        self.capacity = max(8, 2 * len(segments))
+        self.coords = array("h", bytes(4 * self.capacity))
+        self.start = 0
+        self.length = len(segments)
+        for i, (x, y) in enumerate(segments):
+            self.coords[2 * i] = x
+            self.coords[2 * i + 1] = y
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index):
+        if index == 0 and self.length:
+            # 蛇头是最常用的访问，单独走快速路径
+            return self.coords[2 * self.start], self.coords[2 * self.start + 1]
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("蛇身下标越界")
+        slot = 2 * ((self.start + index) % self.capacity)
+        return self.coords[slot], self.coords[slot + 1]
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        coords, capacity = self.coords, self.capacity
+        for index in range(self.start, self.start + self.length):
+            slot = 2 * (index % capacity)
+            yield coords[slot], coords[slot + 1]
+
+    def __contains__(self, position) -> bool:
+        return any(segment == position for segment in self)
+
+    def push_head(self, position: Tuple[int, int]):
+        if self.length == self.capacity:
+            self._grow()
+        start = self.start - 1 if self.start else self.capacity - 1
+        self.start = start
+        self.coords[2 * start:2 * start + 2] = array("h", position)
+        self.length += 1
+
+    def pop_tail(self) -> Tuple[int, int]:
+        self.length -= 1
+        slot = 2 * ((self.start + self.length) % self.capacity)
+        return self.coords[slot], self.coords[slot + 1]
+
+    def chunks(self) -> List[memoryview]:
+        """按蛇头到蛇尾的顺序返回坐标所在的一到两段连续内存"""
+        view = memoryview(self.coords)
+        end = self.start + self.length
+        if end <= self.capacity:
+            return [view[2 * self.start:2 * end]]
+        return [view[2 * self.start:], view[:2 * (end - self.capacity)]]
+
+    def _grow(self):
+        coords = array("h", bytes(8 * self.capacity))
+        offset = 0
+        for chunk in self.chunks():
+            coords[offset:offset + len(chunk)] = array("h", chunk)
+            offset += len(chunk)
+        self.coords = coords
+        self.capacity *= 2
+        self.start = 0
+
+
+class FoodArray:
+    """食物坐标：连续的 int16 数组加上 坐标 -> 下标 的字典，删除时用最后一个元素填补空位"""
+
+    def __init__(self):
+        self.coords = array("h")
+        self.slots: Dict[Tuple[int, int], int] = {}
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def __contains__(self, position) -> bool:
+        return position in self.slots
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        return iter(self.slots)
+
+    def add(self, position: Tuple[int, int]):
+        if position in self.slots:
+            return
+        self.slots[position] = len(self.slots)
+        self.coords.extend(position)
+
+    def remove(self, position: Tuple[int, int]):
+        slot = self.slots.pop(position)
+        last = len(self.slots)
+        if slot != last:
+            moved = (self.coords[2 * last], self.coords[2 * last + 1])
+            self.coords[2 * slot:2 * slot + 2] = self.coords[2 * last:2 * last + 2]
+            self.slots[moved] = slot
+        del self.coords[2 * last:]
+
+    def clear(self):
+        self.coords = array("h")
+        self.slots.clear()
+
+
+class FrameEncoder:
+    """把整张地图编码为二进制状态帧
+
+    输出缓冲区在帧之间复用，坐标直接从 BodyRing / FoodArray 的数组按
+    memoryview 切片拷贝，不为每个蛇身格子创建 Python 对象。
+    """
+
+    def __init__(self):
+        self.buffer = bytearray(4096)
+        self.id_bytes: Dict[str, bytes] = {}
+
+    def encode_id(self, player_id: str) -> bytes:
+        encoded = self.id_bytes.get(player_id)
+        if encoded is None:
+            encoded = self.id_bytes[player_id] = player_id.encode("utf-8")[:255]
+        return encoded
+
+    def forget(self, player_id: str):
+        self.id_bytes.pop(player_id, None)
+
+    def encode(self, seq: int, tick: int, width: int, height: int, snakes, foods: FoodArray,
+               acks: Dict[str, int], color_count: int) -> bytes:
+        ids = {player_id: self.encode_id(player_id) for player_id in snakes}
+        ack_ids = {player_id: self.encode_id(player_id) for player_id in acks}
+        size = (FRAME_HEADER.size + sum(1 + len(data) + ACK_SEQ.size for data in ack_ids.values())
+                + sum(SNAKE_HEADER.size + len(ids[player_id]) + 4 * len(snake.body)
+                      for player_id, snake in snakes.items())
+                + 4 * len(foods))
+        if size > len(self.buffer):
+            self.buffer = bytearray(max(size, 2 * len(self.buffer)))
+        buffer = self.buffer
+        out = memoryview(buffer)
+
+        FRAME_HEADER.pack_into(buffer, 0, FRAME_MAGIC, FRAME_VERSION, seq, tick, width, height,
+                               len(snakes), len(foods), len(acks))
+        offset = FRAME_HEADER.size
+
+        for player_id, data in ack_ids.items():
+            buffer[offset] = len(data)
+            out[offset + 1:offset + 1 + len(data)] = data
+            offset += 1 + len(data)
+            ACK_SEQ.pack_into(buffer, offset, acks[player_id])
+            offset += ACK_SEQ.size
+
+        for player_id, snake in snakes.items():
+            data = ids[player_id]
+            SNAKE_HEADER.pack_into(buffer, offset, len(data), snake.color_index % color_count,
+                                   snake.alive, snake.score, len(snake.body))
+            offset += SNAKE_HEADER.size
+            out[offset:offset + len(data)] = data
+            offset += len(data)
+            for chunk in snake.body.chunks():
+                offset = self._copy_coords(out, offset, chunk)
+
+        self._copy_coords(out, offset, memoryview(foods.coords))
+        frame = bytes(out[:size])
+        out.release()
+        return frame
+
+    @staticmethod
+    def _copy_coords(out: memoryview, offset: int, coords: memoryview) -> int:
+        if _SWAP:
+            swapped = array("h", coords)
+            swapped.byteswap()
+            coords = memoryview(swapped)
+        end = offset + coords.nbytes
+        out[offset:end] = coords.cast("B")
+        return end
+
+
+def is_binary_frame(data) -> bool:
+    return isinstance(data, (bytes, bytearray)) and data[:2] == FRAME_MAGIC
+
+
+def decode_frame(data: bytes) -> dict:
+    """把二进制状态帧解码为和JSON状态帧相同结构的字典（客户端使用），格式错误时抛出 ValueError"""
+    try:
+        return _decode_frame(data)
+    except (struct.error, IndexError) as e:
+        raise ValueError(f"状态帧格式错误: {e}")
+
+
+def _decode_frame(data: bytes) -> dict:
+    (_, version, seq, tick, width, height,
+     snake_count, food_count, ack_count) = FRAME_HEADER.unpack_from(data, 0)
+    if version != FRAME_VERSION:
+        raise ValueError(f"不支持的状态帧版本: {version}")
+    offset = FRAME_HEADER.size
+
+    acks = {}
+    for _ in range(ack_count):
+        id_length = data[offset]
+        player_id = data[offset + 1:offset + 1 + id_length].decode("utf-8")
+        offset += 1 + id_length
+        acks[player_id] = ACK_SEQ.unpack_from(data, offset)[0]
+        offset += ACK_SEQ.size
+
+    snakes = {}
+    for _ in range(snake_count):
+        id_length, color_index, alive, score, length = SNAKE_HEADER.unpack_from(data, offset)
+        offset += SNAKE_HEADER.size
+        player_id = data[offset:offset + id_length].decode("utf-8")
+        offset += id_length
+        coords = _read_coords(data, offset, length)
+        offset += 4 * length
+        snakes[player_id] = {
+            "body": list(zip(coords[0::2], coords[1::2])),
+            "alive": bool(alive),
+            "score": score,
+            "color_index": color_index
+        }
+
+    coords = _read_coords(data, offset, food_count)
+    return {
+        "type": "game_state",
+        "seq": seq,
+        "tick": tick,
+        "acks": acks,
+        "snakes": snakes,
+        "foods": [{"position": position} for position in zip(coords[0::2], coords[1::2])],
+        "grid_size": {"width": width, "height": height}
+    }
+
+
+def _read_coords(data: bytes, offset: int, count: int) -> array:
+    coords = array("h")
+    coords.frombytes(data[offset:offset + 4 * count])
+    if _SWAP:
+        coords.byteswap()
+    return coords
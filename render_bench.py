@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import time
+from typing import Callable, Dict, List, Tuple
+
+# 无界面运行：必须在导入 pygame 之前设置
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from snake_game import Direction, Food, Snake, SnakeGame
+from online.snake_game_ol_client import SnakeClient
+from online.snake_game_ol_server import PlayerColors
+
+
+def serpentine(length: int, width: int, height: int, x0: int = 0, y0: int = 0) -> List[Tuple[int, int]]:
+    """在 width x height 的区域内按蛇形排列一条长度为 length 的蛇（蛇头在前）"""
+    cells = []
+    for row in range(height):
+        xs = range(width) if row % 2 == 0 else range(width - 1, -1, -1)
+        cells.extend((x0 + x, y0 + row) for x in xs)
+    return cells[:min(length, width * height)][::-1]
+
+
+def percentile(values: List[float], q: float) -> float:
+    index = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return values[index]
+
+
+def time_calls(draws: Dict[str, Callable[[], None]], frames: int) -> Dict[str, List[float]]:
+    """每一帧按顺序调用各个绘制函数，分别记录耗时（毫秒）"""
+    samples = {name: [] for name in draws}
+    samples["frame"] = []
+    for _ in range(frames):
+        frame_start = time.perf_counter()
+        for name, draw in draws.items():
+            start = time.perf_counter()
+            draw()
+            samples[name].append((time.perf_counter() - start) * 1000)
+        samples["frame"].append((time.perf_counter() - frame_start) * 1000)
+    return samples
+
+
+def set_window(target, width: int, height: int, flags: int = 0):
+    target.WINDOW_WIDTH, target.WINDOW_HEIGHT = width, height
+    target.screen = pygame.display.set_mode((width, height), flags)
+
+
+def bench_single(width: int, height: int, length: int, frames: int) -> Dict[str, List[float]]:
+    """单机版：固定 32x20 网格，窗口大小只影响背景和居中位置"""
+    game = SnakeGame()
+    try:
+        set_window(game, width, height)
+        game.game_offset_x = (game.WINDOW_WIDTH - game.GRID_WIDTH * game.GRID_SIZE) // 2
+        game.game_offset_y = (game.WINDOW_HEIGHT - game.GRID_HEIGHT * game.GRID_SIZE) // 2 + 30
+
+        game.snake = Snake((3, 0))
+        game.snake.body = serpentine(length, game.GRID_WIDTH, game.GRID_HEIGHT)
+        game.snake.direction = Direction.RIGHT
+        game.food = Food(game.GRID_WIDTH, game.GRID_HEIGHT, game.snake.body)
+
+        return time_calls({
+            "draw_gradient_background": game.draw_gradient_background,
+            "draw_game_grid": game.draw_game_grid,
+            "draw_snake": game.draw_snake,
+            "draw_food": game.draw_food,
+            "draw_ui": game.draw_ui,
+        }, frames)
+    finally:
+        game.high_scores.close()
+
+
+def synthetic_state(world: Tuple[int, int], snakes: int, length: int, foods: int) -> dict:
+    """生成一帧和服务器格式相同的完整状态：snakes 条蛇各占一块区域，食物均匀分布"""
+    world_width, world_height = world
+    band = max(1, world_height // snakes)
+    state = {"type": "game_state", "seq": 1, "tick": 1, "acks": {}, "snakes": {}, "foods": [],
+             "grid_size": {"width": world_width, "height": world_height}, "colors": PlayerColors.COLORS}
+    for i in range(snakes):
+        state["snakes"][f"p{i}"] = {
+            "body": serpentine(length, world_width, band, 0, i * band),
+            "alive": True,
+            "score": 10 * i,
+            "color_index": i % len(PlayerColors.COLORS),
+        }
+    for i in range(foods):
+        state["foods"].append({"position": ((i * 7919) % world_width, (i * 104729) % world_height)})
+    return state
+
+
+def bench_online(width: int, height: int, states: List[dict], frames: int) -> Dict[str, List[float]]:
+    """联网客户端：状态经过 process_messages 进入客户端，和真实收到的帧走同一条路径"""
+    client = SnakeClient()
+    set_window(client, width, height, pygame.RESIZABLE)
+    client.connected = True
+    client.player_id = next(iter(states[0]["snakes"]), None)
+
+    frame = [0]
+
+    def next_state():
+        state = dict(states[frame[0] % len(states)])
+        state["seq"] = frame[0] + 1
+        client.message_queue.put(state)
+        client.process_messages()
+        frame[0] += 1
+
+    next_state()
+    if client.camera_mode:
+        draws = {
+            "draw_gradient_background": client.draw_gradient_background,
+            "draw_camera_view": client.draw_camera_view,
+            "draw_minimap": client.draw_minimap,
+            "draw_ui": client.draw_ui,
+        }
+    else:
+        draws = {
+            "draw_gradient_background": client.draw_gradient_background,
+            "draw_game_grid": client.draw_game_grid,
+            "draw_snakes": client.draw_snakes,
+            "draw_foods": client.draw_foods,
+            "draw_ui": client.draw_ui,
+        }
+    # 录制的多帧状态轮流播放；每帧状态的处理（重建格子映射等）单独计时
+    if len(states) > 1:
+        draws = {"process_messages": next_state, **draws}
+    return time_calls(draws, frames)
+
+
+def load_states(path: str) -> List[dict]:
+    """读取录制的状态帧（JSON lines，每行一帧服务器下发的 game_state）"""
+    states = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                data = json.loads(line)
+                if data.get("type") == "game_state":
+                    states.append(data)
+    if not states:
+        raise SystemExit(f"{path} 中没有 game_state 帧")
+    return states
+
+
+def print_table(title: str, samples: Dict[str, List[float]]):
+    print(f"\n{title}")
+    print(f"  {'函数':<28}{'平均':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'最大':>9}  (ms)")
+    for name, values in samples.items():
+        values = sorted(values)
+        print(f"  {name:<28}{sum(values) / len(values):>9.3f}{percentile(values, 0.5):>9.3f}"
+              f"{percentile(values, 0.95):>9.3f}{percentile(values, 0.99):>9.3f}{values[-1]:>9.3f}")
+
+
+def parse_size(text: str) -> Tuple[int, int]:
+    width, _, height = text.lower().partition("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="客户端绘制函数的无界面基准测试")
+    parser.add_argument("--client", choices=["single", "online", "both"], default="both")
+    parser.add_argument("--sizes", nargs="+", type=parse_size, default=[(800, 600), (1400, 900), (1920, 1080)],
+                        help="窗口大小，例如 1400x900")
+    parser.add_argument("--lengths", nargs="+", type=int, default=[3, 50, 300], help="蛇的长度")
+    parser.add_argument("--frames", type=int, default=120, help="每种配置绘制的帧数")
+    parser.add_argument("--snakes", type=int, default=5, help="联网客户端合成状态中的蛇数")
+    parser.add_argument("--world", type=parse_size, default=(50, 35), help="联网客户端合成状态的地图大小")
+    parser.add_argument("--foods", type=int, default=8)
+    parser.add_argument("--states", default=None, help="使用录制的状态帧（JSON lines）代替合成状态")
+    args = parser.parse_args(argv)
+
+    print(f"* 视频驱动: {os.environ['SDL_VIDEODRIVER']}，每种配置 {args.frames} 帧")
+    for width, height in args.sizes:
+        if args.client in ("single", "both"):
+            for length in args.lengths:
+                samples = bench_single(width, height, length, args.frames)
+                print_table(f"[单机版] 窗口 {width}x{height}，蛇长 {length}", samples)
+
+        if args.client in ("online", "both"):
+            if args.states:
+                samples = bench_online(width, height, load_states(args.states), args.frames)
+                print_table(f"[联网版] 窗口 {width}x{height}，录制状态 {args.states}", samples)
+                continue
+            for length in args.lengths:
+                state = synthetic_state(args.world, args.snakes, length, args.foods)
+                samples = bench_online(width, height, [state], args.frames)
+                print_table(f"[联网版] 窗口 {width}x{height}，地图 {args.world[0]}x{args.world[1]}，"
+                            f"{args.snakes} 条蛇，蛇长 {length}", samples)
+
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import argparse
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional, Tuple
+
+# 无界面渲染：必须在导入 pygame 之前设置（工作进程会继承环境变量）
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from online.snake_game_ol_client import SnakeClient
+
+# 每个工作进程复用一个客户端实例，只创建一次窗口和字体
+_client: Optional[SnakeClient] = None
+
+
+def index_recording(path: str) -> Tuple[dict, List[int]]:
+    """扫描录制文件，返回对局信息和每一帧所在的字节偏移（不解析帧内容）"""
+    offsets = []
+    with open(path, "rb") as f:
+        first = f.readline()
+        header = json.loads(first)
+        offset = len(first)
+        if header.get("type") != "match":
+            # 没有对局信息行，第一行就是第一帧
+            header, offset = {}, 0
+            f.seek(0)
+        for line in f:
+            if line.strip():
+                offsets.append(offset)
+            offset += len(line)
+    return header, offsets
+
+
+def init_worker(size: Tuple[int, int], follow: Optional[str]):
+    global _client
+    _client = SnakeClient()
+    _client.WINDOW_WIDTH, _client.WINDOW_HEIGHT = size
+    _client.screen = pygame.display.set_mode(size)
+    _client.connected = True
+    _client.player_id = follow
+
+
+def render_frame(client: SnakeClient, state: dict):
+    """和 SnakeClient.run 相同的绘制顺序，只是不画连接状态等界面"""
+    client.message_queue.put(state)
+    client.process_messages()
+
+    client.draw_gradient_background()
+    if client.camera_mode:
+        client.draw_camera_view()
+        client.draw_minimap()
+    else:
+        client.draw_game_grid()
+        client.draw_snakes()
+        client.draw_foods()
+
+    snakes = sorted(state["snakes"].values(), key=lambda snake: snake["score"], reverse=True)
+    label = f"tick {state.get('tick', 0)}   " + "  ".join(
+        f"{client.colors[snake['color_index']]['name']} {snake['score']}" for snake in snakes[:5]
+        if snake["color_index"] < len(client.colors))
+    client.screen.blit(client.font_small.render(label, True, (255, 255, 255)), (20, 20))
+
+
+def render_range(path: str, offset: int, count: int, first_index: int, start: int, every: int, out_dir: str,
+                 colors: list) -> int:
+    """工作进程入口：从 offset 开始逐行读取 count 帧并渲染为 PNG，内存占用与帧数无关
+
+    从第 start 帧起每 every 帧渲染一帧，和合成 GIF 时使用的帧序号一致
+    """
+    client = _client
+    client.colors = colors
+    written = 0
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for index in range(first_index, first_index + count):
+            line = f.readline()
+            if (index - start) % every:
+                continue
+            state = json.loads(line)
+            # 每帧都是完整状态，丢弃客户端上的旧序号，保证乱序分配的帧也会被处理
+            client.last_frame_seq = -1
+            render_frame(client, state)
+            pygame.image.save(client.screen, os.path.join(out_dir, f"frame_{index:06d}.png"))
+            written += 1
+    return written
+
+
+def write_gif(paths: List[str], gif_path: str, duration_ms: int, scale: float) -> bool:
+    """用 Pillow 把 PNG 序列合成 GIF；没有安装 Pillow 时返回 False"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return False
+
+    def frames():
+        for path in paths[1:]:
+            with Image.open(path) as image:
+                yield shrink(image)
+
+    def shrink(image):
+        if scale != 1.0:
+            image = image.resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))))
+        return image.convert("P", palette=Image.ADAPTIVE)
+
+    with Image.open(paths[0]) as first:
+        shrink(first).save(gif_path, save_all=True, append_images=frames(), duration=duration_ms, loop=0)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把录制的对局离线渲染为PNG序列/GIF（多进程）")
+    parser.add_argument("recording", help="服务器 --record 录制的文件")
+    parser.add_argument("--out", default="replay_frames", help="PNG 输出目录")
+    parser.add_argument("--gif", default=None, help="同时输出GIF（需要安装 Pillow）")
+    parser.add_argument("--gif-scale", type=float, default=0.5, help="GIF 相对窗口的缩放比例")
+    parser.add_argument("--size", default="1000x700", help="渲染窗口大小")
+    parser.add_argument("--start", type=int, default=0, help="起始帧")
+    parser.add_argument("--end", type=int, default=None, help="结束帧（不含）")
+    parser.add_argument("--every", type=int, default=1, help="每隔几帧渲染一帧")
+    parser.add_argument("--follow", default=None, help="大地图时镜头跟随的玩家ID")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    width, _, height = args.size.lower().partition("x")
+    size = (int(width), int(height))
+    header, offsets = index_recording(args.recording)
+    offsets = offsets[args.start:args.end]
+    if not offsets:
+        raise SystemExit("录制文件中没有可渲染的帧")
+    os.makedirs(args.out, exist_ok=True)
+
+    # 每个进程分到若干段，段数多于进程数以便负载均衡
+    chunk = max(args.every, math.ceil(len(offsets) / (args.workers * 4)))
+    chunk = math.ceil(chunk / args.every) * args.every
+    tick_rate = header.get("tick_rate", 10)
+    colors = header.get("colors", [])
+
+    print(f"* 渲染 {len(offsets)} 帧（每 {args.every} 帧取 1 帧），{args.workers} 个进程")
+    start = time.perf_counter()
+    written = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                             initargs=(size, args.follow)) as executor:
+        futures = []
+        for first in range(0, len(offsets), chunk):
+            count = min(chunk, len(offsets) - first)
+            futures.append(executor.submit(render_range, args.recording, offsets[first], count,
+                                           args.start + first, args.start, args.every, args.out, colors))
+        for future in as_completed(futures):
+            written += future.result()
+            elapsed = time.perf_counter() - start
+            print(f"* 已渲染 {written} 帧，{written / elapsed:.1f} 帧/秒")
+
+    elapsed = time.perf_counter() - start
+    match_seconds = len(offsets) / tick_rate
+    print(f"\n共 {written} 帧，用时 {elapsed:.1f} 秒，对局时长 {match_seconds:.1f} 秒"
+          f"（{match_seconds / elapsed:.1f} 倍速）")
+
+    if args.gif:
+        paths = [os.path.join(args.out, f"frame_{index:06d}.png")
+                 for index in range(args.start, args.start + len(offsets), args.every)]
+        if write_gif(paths, args.gif, int(1000 * args.every / tick_rate), args.gif_scale):
+            print(f"* GIF 已保存到 {args.gif}")
+        else:
+            print("* 未安装 Pillow，只输出了 PNG 序列（pip install Pillow 后可生成 GIF）")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,13 @@
 import pygame
 import random
-import json
-import os
-import platform
+import time
 from enum import Enum
 from typing import List, Tuple
 import math
 
-pygame.init()
+from client_startup import LazyFont, init_pygame
+from frame_profiler import FrameProfiler
+from high_score_store import HighScoreStore
 
 
 class GameState(Enum):
@@ -41,43 +41,6 @@ class Colors:
     SHADOW = (0, 0, 0, 50)
 
 
-def get_chinese_font(size):
-    """获取支持中文的字体"""
-    system = platform.system()
-
-    # 兼容多系统
-    chinese_fonts = []
-
-    if system == "Windows":
-        chinese_fonts = [
-            "C:/Windows/Fonts/msyh.ttc",  # 微软雅黑
-            "C:/Windows/Fonts/simhei.ttf",  # 黑体
-            "C:/Windows/Fonts/simsun.ttc",  # 宋体
-            "C:/Windows/Fonts/arial.ttf",  # Arial (fallback)
-        ]
-    elif system == "Darwin":  # macOS
-        chinese_fonts = [
-            "/System/Library/Fonts/PingFang.ttc",  # 苹方
-            "/System/Library/Fonts/STHeiti Light.ttc",  # 黑体
-            "/System/Library/Fonts/Hiragino Sans GB.ttc",  # 冬青黑体
-            "/System/Library/Fonts/Arial.ttf",  # Arial (fallback)
-        ]
-    else:  # Linux
-        chinese_fonts = [
-            "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",  # 文泉驿微米黑
-            "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",  # 文泉驿正黑
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",  # DejaVu Sans
-            "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
-        ]
-
-    for font_path in chinese_fonts:
-        try:
-            if os.path.exists(font_path):
-                return pygame.font.Font(font_path, size)
-        except Exception as e:
-            continue
-
-
 class Snake:
     def __init__(self, start_pos: Tuple[int, int]):
         self.body = [start_pos, (start_pos[0] - 1, start_pos[1]), (start_pos[0] - 2, start_pos[1])]
@@ -144,23 +107,31 @@ class SnakeGame:
         self.GRID_WIDTH = 32
         self.GRID_HEIGHT = 20
 
+        init_pygame()
         self.screen = pygame.display.set_mode((self.WINDOW_WIDTH, self.WINDOW_HEIGHT))
         pygame.display.set_caption("贪吃蛇 - Snake Game")
 
         self.clock = pygame.time.Clock()
 
         # 使用支持中文的字体
-        self.font_large = get_chinese_font(48)
-        self.font_medium = get_chinese_font(32)
-        self.font_small = get_chinese_font(24)
+        self.font_large = LazyFont(48)
+        self.font_medium = LazyFont(32)
+        self.font_small = LazyFont(24)
 
         self.game_state = GameState.MENU
         self.snake = None
         self.food = None
         self.score = 0
-        self.high_score = self.load_high_score()
+        # 排行榜只在启动时读取一次，之后由后台线程负责写入，游戏循环中不做文件读写
+        self.high_scores = HighScoreStore()
+        self.high_score = self.high_scores.best
+        self.score_submitted = True  # 当前这局的得分是否已经提交到排行榜
         self.game_speed = 8
 
+        # 分阶段帧计时（F3 显示/隐藏，F4 导出追踪文件）
+        self.profiler = FrameProfiler()
+        self.profiler_font = LazyFont(16)
+
         # 动画相关
         self.transition_alpha = 0
         self.button_hover_states = {}
@@ -169,29 +140,21 @@ class SnakeGame:
         self.game_offset_x = (self.WINDOW_WIDTH - self.GRID_WIDTH * self.GRID_SIZE) // 2
         self.game_offset_y = (self.WINDOW_HEIGHT - self.GRID_HEIGHT * self.GRID_SIZE) // 2 + 30
 
-    def load_high_score(self) -> int:
-        try:
-            if os.path.exists('high_score.json'):
-                with open('high_score.json', 'r') as f:
-                    return json.load(f).get('high_score', 0)
-        except:
-            pass
-        return 0
-
-    def save_high_score(self):
-        try:
-            with open('high_score.json', 'w') as f:
-                json.dump({'high_score': self.high_score}, f)
-        except:
-            pass
+    def submit_score(self):
+        """一局结束（死亡、重新开始或中途退出）时把得分提交到排行榜，每局只提交一次"""
+        if not self.score_submitted:
+            self.high_scores.submit(self.score)
+            self.score_submitted = True
 
     def start_new_game(self):
+        self.submit_score()
         start_pos = (self.GRID_WIDTH // 2, self.GRID_HEIGHT // 2)
         self.snake = Snake(start_pos)
         self.food = Food(self.GRID_WIDTH, self.GRID_HEIGHT, self.snake.body)
         self.score = 0
         self.game_speed = 8
         self.game_state = GameState.PLAYING
+        self.score_submitted = False
 
     def draw_gradient_background(self):
         for y in range(self.WINDOW_HEIGHT):
@@ -360,6 +323,13 @@ class SnakeGame:
         if self.draw_button("退出游戏", self.WINDOW_WIDTH // 2 - 100, 370, 200, 50, "quit"):
             return False
 
+        # 排行榜（前5名）
+        for i, entry in enumerate(self.high_scores.entries[:5]):
+            played_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["time"])) if entry["time"] else "-"
+            entry_text = self.font_small.render(f"{i + 1}. {entry['score']}    {played_at}", True, Colors.TEXT_SECONDARY)
+            entry_rect = entry_text.get_rect(center=(self.WINDOW_WIDTH // 2, 460 + i * 32))
+            self.screen.blit(entry_text, entry_rect)
+
         return True
 
     def draw_pause_menu(self):
@@ -384,6 +354,7 @@ class SnakeGame:
 
         # 返回菜单按钮
         if self.draw_button("返回菜单", self.WINDOW_WIDTH // 2 - 100, 460, 200, 50, "menu"):
+            self.submit_score()
             self.game_state = GameState.MENU
 
     def draw_game_over(self):
@@ -423,6 +394,11 @@ class SnakeGame:
                 return False
 
             if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_F3:
+                    self.profiler.toggle()
+                elif event.key == pygame.K_F4 and self.profiler.enabled:
+                    print(f"帧追踪已保存到 {self.profiler.dump()}")
+
                 if self.game_state == GameState.PLAYING:
                     # 方向控制
                     if event.key in [pygame.K_UP, pygame.K_w]:
@@ -436,12 +412,14 @@ class SnakeGame:
                     elif event.key == pygame.K_SPACE:
                         self.game_state = GameState.PAUSED
                     elif event.key == pygame.K_ESCAPE:
+                        self.submit_score()
                         self.game_state = GameState.MENU
 
                 elif self.game_state == GameState.PAUSED:
                     if event.key == pygame.K_SPACE:
                         self.game_state = GameState.PLAYING
                     elif event.key == pygame.K_ESCAPE:
+                        self.submit_score()
                         self.game_state = GameState.MENU
 
                 elif self.game_state in [GameState.MENU, GameState.GAME_OVER]:
@@ -465,7 +443,6 @@ class SnakeGame:
             self.score += 10
             if self.score > self.high_score:
                 self.high_score = self.score
-                self.save_high_score()
 
             # 生成新食物
             self.food = Food(self.GRID_WIDTH, self.GRID_HEIGHT, self.snake.body)
@@ -477,47 +454,61 @@ class SnakeGame:
         # 检查碰撞
         if self.snake.check_collision(self.GRID_WIDTH, self.GRID_HEIGHT):
             self.game_state = GameState.GAME_OVER
+            self.submit_score()
 
     def run(self):
         running = True
 
+        profiler = self.profiler
         while running:
+            profiler.begin_frame()
             running = self.handle_events()
+            profiler.lap("events")
 
             if not running:
                 break
 
             self.update_game()
+            profiler.lap("update")
 
             # 绘制
             self.draw_gradient_background()
+            profiler.lap("background")
 
             if self.game_state == GameState.MENU:
                 running = self.draw_menu()
+                profiler.lap("menu")
 
-            elif self.game_state in [GameState.PLAYING, GameState.PAUSED]:
+            elif self.game_state in [GameState.PLAYING, GameState.PAUSED, GameState.GAME_OVER]:
                 self.draw_game_grid()
+                profiler.lap("grid")
                 if self.snake:
                     self.draw_snake()
+                    profiler.lap("snake")
                 if self.food:
                     self.draw_food()
+                    profiler.lap("food")
                 self.draw_ui()
+                profiler.lap("ui")
 
                 if self.game_state == GameState.PAUSED:
                     self.draw_pause_menu()
+                    profiler.lap("overlay")
+                elif self.game_state == GameState.GAME_OVER:
+                    self.draw_game_over()
+                    profiler.lap("overlay")
 
-            elif self.game_state == GameState.GAME_OVER:
-                self.draw_game_grid()
-                if self.snake:
-                    self.draw_snake()
-                if self.food:
-                    self.draw_food()
-                self.draw_ui()
-                self.draw_game_over()
-
+            profiler.draw(self.screen, self.profiler_font)
+            profiler.lap("profiler")
             pygame.display.flip()
+            profiler.lap("flip")
             self.clock.tick(self.game_speed if self.game_state == GameState.PLAYING else 60)
+            profiler.lap("wait")
+            profiler.end_frame()
 
+        # 退出前提交当前得分，并等待后台线程把排行榜写入文件
+        self.submit_score()
+        self.high_scores.close()
         pygame.quit()
 
 
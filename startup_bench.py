@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# 子进程里执行的启动流程：和正常启动相同，画完第一帧后输出各阶段的时间戳并退出
+CHILD = r"""
+import json, sys, time
+marks = {"start": time.time()}
+if INIT_ALL:
+    import pygame
+    pygame.init()
+    marks["init_all"] = time.time()
+if CLIENT == "single":
+    from snake_game import SnakeGame as Game
+else:
+    from online.snake_game_ol_client import SnakeClient as Game
+marks["import"] = time.time()
+game = Game()
+marks["construct"] = time.time()
+game.draw_gradient_background()
+if CLIENT == "single":
+    game.draw_menu()
+else:
+    game.draw_connection_screen()
+import pygame
+pygame.display.flip()
+marks["first_frame"] = time.time()
+if CLIENT == "single":
+    game.high_scores.close()
+print(json.dumps(marks))
+"""
+
+
+def run_once(client: str, init_all: bool, env: dict) -> dict:
+    """启动一个子进程，返回从启动进程到各阶段完成的毫秒数"""
+    code = CHILD.replace("INIT_ALL", repr(init_all)).replace("CLIENT", repr(client))
+    spawned = time.time()
+    output = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    marks = json.loads(output.stdout.strip().splitlines()[-1])
+    return {name: (stamp - spawned) * 1000 for name, stamp in marks.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="客户端启动到第一帧的耗时基准（每次启动一个新进程）")
+    parser.add_argument("--client", choices=["single", "online", "both"], default="both")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--cold", action="store_true", help="每次启动前删除字体缓存")
+    parser.add_argument("--init-all", action="store_true", help="对比：先调用 pygame.init() 初始化全部模块")
+    parser.add_argument("--show", action="store_true", help="使用真实窗口（默认无界面运行）")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    if not args.show:
+        env.setdefault("SDL_VIDEODRIVER", "dummy")
+    env["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+    cache_dir = tempfile.mkdtemp(prefix="snake_startup_")
+    cache_path = os.path.join(cache_dir, "font_cache.json")
+    env["SNAKE_FONT_CACHE"] = cache_path
+
+    clients = ["single", "online"] if args.client == "both" else [args.client]
+    try:
+        for client in clients:
+            # 预热一次：让系统文件缓存和字体缓存就绪，不计入结果
+            run_once(client, args.init_all, env)
+            results = []
+            for _ in range(args.runs):
+                if args.cold and os.path.exists(cache_path):
+                    os.remove(cache_path)
+                results.append(run_once(client, args.init_all, env))
+
+            print(f"\n[{client}] {args.runs} 次启动，{'冷' if args.cold else '热'}字体缓存"
+                  f"{'，pygame.init() 全部初始化' if args.init_all else ''}（从启动进程开始计时，ms）")
+            for phase in results[0]:
+                values = sorted(result[phase] for result in results)
+                print(f"  {phase:<12}平均 {sum(values) / len(values):8.1f}   "
+                      f"中位数 {values[len(values) // 2]:8.1f}   最大 {values[-1]:8.1f}")
+    finally:
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+        os.rmdir(cache_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import argparse
+import importlib
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+from online.bots import DIRECTION_VECTORS, OPPOSITE, BotController
+from online.snake_game_ol_server import Direction, GameServer
+
+# 策略函数：policy(match, snake) -> 方向名（"UP"/"DOWN"/"LEFT"/"RIGHT"）或 None（保持方向）
+Policy = Callable[[GameServer, object], Optional[str]]
+
+
+def safe_moves(match, snake):
+    """不回头且不会立刻撞到墙或蛇的方向"""
+    head = snake.body[0]
+    moves = []
+    for name, (dx, dy) in DIRECTION_VECTORS.items():
+        if name == OPPOSITE[snake.direction.name]:
+            continue
+        pos = (head[0] + dx, head[1] + dy)
+        if (0 <= pos[0] < match.GRID_WIDTH and 0 <= pos[1] < match.GRID_HEIGHT and
+                match.snake_index.is_free(pos)):
+            moves.append((name, pos))
+    return moves
+
+
+def random_policy(match, snake):
+    """随机选择一个安全方向"""
+    moves = safe_moves(match, snake)
+    return random.choice(moves)[0] if moves else None
+
+
+def greedy_policy(match, snake):
+    """朝曼哈顿距离最近的食物走（不考虑绕路）"""
+    moves = safe_moves(match, snake)
+    if not moves or not match.foods:
+        return None
+    head = snake.body[0]
+    target = min(match.foods, key=lambda pos: abs(pos[0] - head[0]) + abs(pos[1] - head[1]))
+    return min(moves, key=lambda move: abs(move[1][0] - target[0]) + abs(move[1][1] - target[1]))[0]
+
+
+def field_policy(match, snake):
+    """和服务器机器人相同的距离场策略，距离场每个tick只算一次，由所有使用该策略的玩家共享"""
+    controller = match.shared.get("bot_controller")
+    if controller is None:
+        controller = match.shared["bot_controller"] = BotController()
+        controller.field.compute(match.GRID_WIDTH, match.GRID_HEIGHT, match.snake_index,
+                                 match.food_index, None, math.inf)
+    return controller.choose_direction(match, snake)
+
+
+def load_policy(spec: str) -> Policy:
+    """按 "模块:函数" 加载策略，不写模块名时使用本文件中的策略"""
+    module_name, _, attr = spec.rpartition(":")
+    module = importlib.import_module(module_name or __name__)
+    return getattr(module, attr)
+
+
+class HeadlessMatch(GameServer):
+    """不带网络的对局，复用服务器的游戏规则，并记录每条命的得分和存活时长"""
+
+    def __init__(self, policies: List[Policy], grid_width: int, grid_height: int, food_count: int,
+                 seed: Optional[int] = None):
+        super().__init__(grid_width, grid_height, len(policies), food_count, seed=seed)
+        self.policies = {}
+        self.shared = {}  # 每个tick清空，供策略共享预计算结果
+        self.life_start: Dict[str, int] = {}
+        self.lives: Dict[str, List[tuple]] = {}
+
+        for seat, policy in enumerate(policies):
+            player_id = f"p{seat}"
+            self.create_snake(player_id)
+            self.policies[player_id] = policy
+            self.life_start[player_id] = 0
+            self.lives[player_id] = []
+
+    def respawn_dead_snakes(self):
+        # 记录刚死亡的蛇这条命的得分和存活tick数（重生前分数还没有清零）
+        for player_id, snake in self.snakes.items():
+            if not snake.alive and self.life_start[player_id] is not None:
+                self.lives[player_id].append((snake.score, self.tick - self.life_start[player_id]))
+                self.life_start[player_id] = None
+
+        super().respawn_dead_snakes()
+
+        for player_id, snake in self.snakes.items():
+            if snake.alive and self.life_start[player_id] is None:
+                self.life_start[player_id] = self.tick
+
+    def step(self):
+        self.shared.clear()
+        for player_id, policy in self.policies.items():
+            snake = self.snakes[player_id]
+            if snake.alive:
+                direction = policy(self, snake)
+                if direction:
+                    snake.change_direction(Direction[direction])
+        self.update_game()
+
+    def finish(self):
+        """对局结束时把仍然活着的蛇也记为一条命"""
+        for player_id, snake in self.snakes.items():
+            if snake.alive:
+                self.lives[player_id].append((snake.score, self.tick - self.life_start[player_id]))
+
+
+def run_batch(specs: List[str], seeds: List[int], ticks: int, grid_width: int, grid_height: int,
+              food_count: int) -> dict:
+    """工作进程入口：连续跑一批对局，只把汇总结果传回主进程以减少进程间通信"""
+    policies = [load_policy(spec) for spec in specs]
+    stats = {spec: {"lives": 0, "score": 0, "best": 0, "survival": 0} for spec in specs}
+
+    for seed in seeds:
+        random.seed(seed)
+        # 轮换座位，消除起始位置带来的优势
+        shift = seed % len(specs)
+        seating = specs[shift:] + specs[:shift]
+
+        match = HeadlessMatch([policies[specs.index(spec)] for spec in seating],
+                              grid_width, grid_height, food_count, seed)
+        for _ in range(ticks):
+            match.step()
+        match.finish()
+
+        for seat, spec in enumerate(seating):
+            for score, survival in match.lives[f"p{seat}"]:
+                entry = stats[spec]
+                entry["lives"] += 1
+                entry["score"] += score
+                entry["best"] = max(entry["best"], score)
+                entry["survival"] += survival
+
+    return {"games": len(seeds), "stats": stats}
+
+
+def run_tournament(specs: List[str], games: int, workers: int, batch_size: int, ticks: int,
+                   grid_width: int, grid_height: int, food_count: int, seed: int = 0) -> dict:
+    """把对局分批分发到进程池，边完成边汇总"""
+    totals = {spec: {"lives": 0, "score": 0, "best": 0, "survival": 0} for spec in specs}
+    finished = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for first in range(0, games, batch_size):
+            seeds = list(range(seed + first, seed + min(games, first + batch_size)))
+            futures.append(executor.submit(run_batch, specs, seeds, ticks,
+                                           grid_width, grid_height, food_count))
+
+        for future in as_completed(futures):
+            result = future.result()
+            finished += result["games"]
+            for spec, entry in result["stats"].items():
+                total = totals[spec]
+                total["lives"] += entry["lives"]
+                total["score"] += entry["score"]
+                total["best"] = max(total["best"], entry["best"])
+                total["survival"] += entry["survival"]
+
+            elapsed = time.perf_counter() - start
+            print(f"* 已完成 {finished}/{games} 局，{finished / elapsed:.1f} 局/秒")
+
+    elapsed = time.perf_counter() - start
+    return {"games": finished, "elapsed": elapsed, "games_per_sec": finished / elapsed, "totals": totals}
+
+
+def print_report(report: dict):
+    print(f"\n共 {report['games']} 局，用时 {report['elapsed']:.1f} 秒，{report['games_per_sec']:.1f} 局/秒")
+    print(f"{'策略':<28}{'平均每命得分':>12}{'最高分':>8}{'平均存活tick':>14}{'命数':>8}")
+    ranking = sorted(report["totals"].items(),
+                     key=lambda item: item[1]["score"] / max(1, item[1]["lives"]), reverse=True)
+    for spec, total in ranking:
+        lives = max(1, total["lives"])
+        print(f"{spec:<28}{total['score'] / lives:>12.1f}{total['best']:>8}"
+              f"{total['survival'] / lives:>14.1f}{total['lives']:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="贪吃蛇机器人策略锦标赛（无界面，多进程）")
+    parser.add_argument("--policies", nargs="+",
+                        default=[":field_policy", ":greedy_policy", ":random_policy"],
+                        help="参赛策略，格式为 模块:函数，省略模块名表示本文件中的策略")
+    parser.add_argument("--games", type=int, default=200, help="对局总数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="工作进程数")
+    parser.add_argument("--batch-size", type=int, default=10, help="每个任务连续运行的对局数")
+    parser.add_argument("--ticks", type=int, default=500, help="每局的tick数")
+    parser.add_argument("--width", type=int, default=50)
+    parser.add_argument("--height", type=int, default=35)
+    parser.add_argument("--foods", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print(f"* 锦标赛开始：{len(args.policies)} 个策略，{args.games} 局，{args.workers} 个进程")
+    report = run_tournament(args.policies, args.games, args.workers, args.batch_size, args.ticks,
+                            args.width, args.height, args.foods, args.seed)
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()